@@ -0,0 +1,97 @@
+import argparse
+import asyncio
+import json
+import time
+from collections import Counter
+
+from aiohttp import web
+
+BOT_ID = 1000000
+BOT_USERNAME = 'benchmark_bot'
+
+
+class FakeBotApi:
+    def __init__(self, host: str = '127.0.0.1', port: int = 8081, latency: float = 0):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.calls: Counter[str] = Counter()
+        self.message_ids: Counter[int] = Counter()
+        self.runner: web.AppRunner | None = None
+
+    @property
+    def base_url(self) -> str:
+        return f'http://{self.host}:{self.port}/bot'
+
+    def message(self, params: dict, **fields) -> dict:
+        chat_id = int(params.get('chat_id', 0))
+        self.message_ids[chat_id] += 1
+        return {
+            'message_id': self.message_ids[chat_id],
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private' if chat_id > 0 else 'group'},
+            'from': {'id': BOT_ID, 'is_bot': True, 'first_name': 'Benchmark'},
+            **fields
+        }
+
+    def result(self, method: str, params: dict) -> object:
+        if method == 'getMe':
+            return {
+                'id': BOT_ID,
+                'is_bot': True,
+                'first_name': 'Benchmark',
+                'username': BOT_USERNAME,
+                'can_join_groups': True,
+                'can_read_all_group_messages': False,
+                'supports_inline_queries': False
+            }
+        if method in ('sendMessage', 'editMessageText'):
+            return self.message(params, text=params.get('text', ''))
+        if method == 'sendContact':
+            return self.message(params, contact={
+                'phone_number': params.get('phone_number', ''),
+                'first_name': params.get('first_name', '')
+            })
+        return True
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info['method']
+        self.calls[method] += 1
+        if request.content_type == 'application/json':
+            params = await request.json()
+        else:
+            params = dict(await request.post())
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return web.Response(text=json.dumps({'ok': True, 'result': self.result(method, params)}),
+                            content_type='application/json')
+
+    async def start(self) -> None:
+        app = web.Application()
+        app.router.add_post('/bot{token}/{method}', self.handle)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, self.host, self.port).start()
+
+    async def stop(self) -> None:
+        if self.runner is not None:
+            await self.runner.cleanup()
+
+
+async def serve(host: str, port: int, latency: float) -> None:
+    api = FakeBotApi(host, port, latency)
+    await api.start()
+    print(f'Фейковый Bot API слушает {api.base_url}')
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await api.stop()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Локальная замена Telegram Bot API для бенчмарков')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--latency', type=float, default=0, help='искусственная задержка ответа, с')
+    args = parser.parse_args()
+    asyncio.run(serve(args.host, args.port, args.latency))
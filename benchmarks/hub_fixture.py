@@ -0,0 +1,67 @@
+import csv
+import os
+import random
+
+from benchmarks.seed import STATIONS, DAYS, AGES, TYPES, TIMES
+from database.connection import get_wolrus_pool
+from database.models import GroupModel
+
+HUB_TABLE = 'master_data_history_view'
+HUB_COLUMNS = ['subway', 'weekday', 'time_of_hg', 'type_age', 'type_of_hg', 'name_leader', 'enable_for_site']
+GENERAL_HEADER = ['Регион', 'Район', 'Лидер', 'Телефон', 'Телеграм']
+YOUTH_HEADER = ['Регион', 'Лидер', 'Район', 'Телефон', 'Почта', 'Возраст', 'Телеграм']
+REGIONS_COUNT = 30
+
+
+def synthetic_hub_groups(size: int, seed: int = 1) -> list[GroupModel]:
+    generator = random.Random(seed)
+    leaders_count = max(1, size // 3)
+    groups = set()
+    while len(groups) < size:
+        groups.add(GroupModel(
+            metro=generator.choice(STATIONS),
+            day=generator.choice(DAYS),
+            time=generator.choice(TIMES),
+            age=generator.choice(AGES),
+            type=generator.choice(TYPES),
+            leader_name=f'Лидер {generator.randint(1, leaders_count)}'
+        ))
+    return list(groups)
+
+
+async def create_hub_fixture(groups: list[GroupModel]) -> None:
+    pool = await get_wolrus_pool()
+    async with pool.acquire() as connection:
+        relkind = await connection.fetchval('SELECT relkind FROM pg_class WHERE relname = $1', HUB_TABLE)
+        if relkind not in (None, 'r'):
+            raise RuntimeError(f'{HUB_TABLE} уже существует и не является таблицей фикстуры')
+        await connection.execute(
+            f'CREATE TABLE IF NOT EXISTS {HUB_TABLE} (subway text, weekday text, time_of_hg time, type_age text, '
+            f'type_of_hg text, name_leader text, enable_for_site boolean)'
+        )
+        await connection.execute(f'TRUNCATE {HUB_TABLE}')
+        await connection.copy_records_to_table(
+            HUB_TABLE,
+            records=[
+                (group.metro, group.day, group.time, group.age, group.type, group.leader_name, True)
+                for group in groups
+            ],
+            columns=HUB_COLUMNS
+        )
+
+
+def write_leader_sheets(directory: str, general_table_id: str, youth_table_id: str,
+                        groups: list[GroupModel]) -> None:
+    os.makedirs(directory, exist_ok=True)
+    leaders = sorted({group.leader_name for group in groups})
+    youth_leaders = sorted({group.leader_name for group in groups if group.age in AGES[1:]})
+    with open(os.path.join(directory, f'{general_table_id}.csv'), 'w', encoding='utf-8', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(GENERAL_HEADER)
+        for number, leader in enumerate(leaders):
+            writer.writerow([f'Регион {number % REGIONS_COUNT + 1}', '', f' {leader} ', '', f'@leader_{number}'])
+    with open(os.path.join(directory, f'{youth_table_id}.csv'), 'w', encoding='utf-8', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(YOUTH_HEADER)
+        for number, leader in enumerate(youth_leaders):
+            writer.writerow([f'Регион {number % REGIONS_COUNT + 1}', leader, '', '', '', '', f'@youth_{number}'])
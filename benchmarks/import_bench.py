@@ -0,0 +1,61 @@
+import argparse
+import asyncio
+import logging
+import os
+import tempfile
+import time
+
+from benchmarks.hub_fixture import synthetic_hub_groups, create_hub_fixture, write_leader_sheets
+from benchmarks.seed import truncate_tables
+from database.connection import database_init
+from services.adapters import use_adapters, FileSheetSource, CsvJoinSink
+from services.import_service import import_data, GENERAL_TABLE_ID, YOUTH_TABLE_ID, HUB_STAGE, GENERAL_SHEET_STAGE, \
+    YOUTH_SHEET_STAGE, RECONCILIATION_STAGE, CATALOG_STAGE
+
+SIZES = [1000, 10000, 50000]
+STAGES = [HUB_STAGE, GENERAL_SHEET_STAGE, YOUTH_SHEET_STAGE, RECONCILIATION_STAGE, CATALOG_STAGE]
+RUNS = ['первый', 'повторный']
+REQUIRED_ENV = ('DB_CONNECTION_STRING', 'WOL_DB_HOST', 'WOL_DB_NAME', 'WOL_DB_USER', 'WOL_HOME_GROUP_GENERAL_ID',
+                'WOL_HOME_GROUP_YOUTH_ID')
+
+
+async def run(sizes: list[int], directory: str) -> None:
+    await database_init()
+    use_adapters(sheet_source=FileSheetSource(directory), join_sink=CsvJoinSink(os.path.join(directory, 'joins')))
+    print(f'{"строк":>7}{"импорт":>11}' + ''.join(f'{stage:>16}' for stage in STAGES) + f'{"всего, с":>11}')
+    for size in sizes:
+        groups = synthetic_hub_groups(size)
+        await create_hub_fixture(groups)
+        write_leader_sheets(directory, GENERAL_TABLE_ID, YOUTH_TABLE_ID, groups)
+        await truncate_tables()
+        for run_name in RUNS:
+            stage_timings: dict[str, float] = {}
+            started = time.perf_counter()
+            await import_data(stage_timings=stage_timings)
+            elapsed = time.perf_counter() - started
+            print(f'{size:>7}{run_name:>11}' + ''.join(f'{stage_timings.get(stage, 0):>16.2f}' for stage in STAGES) +
+                  f'{elapsed:>11.2f}')
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.WARNING)
+    parser = argparse.ArgumentParser(
+        description='Замеряет этапы import_data на синтетическом хабе и локальных CSV-таблицах',
+        epilog='Нужны переменные окружения: ' + ', '.join(REQUIRED_ENV) + '. '
+               'WOL_DB_* должны указывать на локальную базу: в ней создается таблица-фикстура хаба. '
+               'Перед каждым размером очищаются таблицы бота в DB_CONNECTION_STRING'
+    )
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES, help='количество групп в хабе')
+    parser.add_argument('--dir', help='каталог для CSV-таблиц, по умолчанию временный')
+    parser.add_argument('--truncate', action='store_true', help='разрешить очистку таблиц бота перед замерами')
+    args = parser.parse_args()
+    if not args.truncate:
+        parser.error('бенчмарк очищает таблицы бота в DB_CONNECTION_STRING, подтвердите это флагом --truncate')
+    missing = [name for name in REQUIRED_ENV if not os.getenv(name)]
+    if missing:
+        parser.error('не заданы переменные окружения: ' + ', '.join(missing))
+    if args.dir:
+        asyncio.run(run(args.sizes, args.dir))
+    else:
+        with tempfile.TemporaryDirectory() as directory:
+            asyncio.run(run(args.sizes, directory))
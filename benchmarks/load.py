@@ -0,0 +1,273 @@
+import argparse
+import asyncio
+import functools
+import logging
+import os
+import random
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+from typing import Any, Callable, Coroutine
+
+from sqlalchemy import event
+from telegram import Update
+from telegram.ext import ApplicationBuilder, ExtBot
+
+from benchmarks.fake_bot_api import FakeBotApi
+from benchmarks.seed import STATIONS, DAYS, AGES
+from config import correlation_id
+from database.connection import database_init, engine
+from database.persistence import PostgresPersistence
+from main import handlers_register
+from services.catalog import load_catalog, find_by_metro
+from services.concurrency import ChatOrderedApplication
+from services.keyboard import PICK_GROUP_TEXT
+from services.metrics import instrument_application, instrument_database, instrument_handler, current_handler, \
+    BACKGROUND_HANDLER
+from services.rate_limiter import SendScheduler
+
+BENCHMARK_TOKEN = '123456:benchmark'
+FIRST_CHAT_ID = 100000
+WIZARD_TYPES = ['Общая', 'Мужская', 'Женская', 'Семейная', 'Тематическая', 'Любая']
+SCENARIO_WEIGHTS = {'start': 1, 'metro': 5, 'typo': 1, 'wizard': 3, 'join': 2}
+REQUIRED_ENV = ('DB_CONNECTION_STRING', 'ADMIN_ID', 'YOUTH_ADMIN_ID', 'MINISTRY_LEADER')
+UNPACED_SEND_RATE = 1_000_000
+
+
+def percentile(values: list[float], share: float) -> float:
+    if not values:
+        return 0
+    ordered = sorted(values)
+    return ordered[round(share * (len(ordered) - 1))]
+
+
+class BenchmarkStats:
+    def __init__(self):
+        self.handler_latencies: dict[str, list[float]] = defaultdict(list)
+        self.handler_queries: Counter[str] = Counter()
+        self.update_queries: Counter[int] = Counter()
+        self.update_latencies: list[float] = []
+
+    def count_query(self, conn, cursor, statement, parameters, context, executemany) -> None:
+        self.handler_queries[current_handler.get()] += 1
+        update_id = correlation_id.get()
+        if update_id is not None:
+            self.update_queries[update_id] += 1
+
+    def timed(self, callback: Callable[..., Coroutine[Any, Any, Any]]) -> Callable[..., Coroutine[Any, Any, Any]]:
+        name = callback.__name__
+
+        @functools.wraps(callback)
+        async def timed_callback(update: object, context: Any) -> Any:
+            started = time.perf_counter()
+            try:
+                return await callback(update, context)
+            finally:
+                self.handler_latencies[name].append(time.perf_counter() - started)
+
+        return timed_callback
+
+
+class BenchmarkApplication(ChatOrderedApplication):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.stats = BenchmarkStats()
+        self.enqueued: dict[int, float] = {}
+
+    async def enqueue(self, update: Update) -> None:
+        self.enqueued[update.update_id] = time.perf_counter()
+        await self.update_queue.put(update)
+
+    async def process_update(self, update: object) -> None:
+        try:
+            await super().process_update(update)
+        finally:
+            if isinstance(update, Update) and update.update_id in self.enqueued:
+                self.stats.update_latencies.append(time.perf_counter() - self.enqueued.pop(update.update_id))
+
+
+class UpdateFactory:
+    def __init__(self, bot: ExtBot):
+        self.bot = bot
+        self.update_id = 0
+        self.message_id = 0
+
+    def next_ids(self) -> tuple[int, int]:
+        self.update_id += 1
+        self.message_id += 1
+        return self.update_id, self.message_id
+
+    @staticmethod
+    def user(chat_id: int) -> dict:
+        return {'id': chat_id, 'is_bot': False, 'first_name': f'Имя{chat_id}', 'last_name': 'Тестовый',
+                'username': f'user_{chat_id}'}
+
+    def chat(self, chat_id: int) -> dict:
+        user = self.user(chat_id)
+        return {'id': chat_id, 'type': 'private', 'first_name': user['first_name'], 'last_name': user['last_name'],
+                'username': user['username']}
+
+    def message_data(self, chat_id: int, message_id: int, **fields) -> dict:
+        return {'message_id': message_id, 'date': int(datetime.now().timestamp()), 'chat': self.chat(chat_id),
+                'from': self.user(chat_id), **fields}
+
+    def text(self, chat_id: int, text: str) -> Update:
+        update_id, message_id = self.next_ids()
+        fields = {'text': text}
+        if text.startswith('/'):
+            fields['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}]
+        return Update.de_json({'update_id': update_id, 'message': self.message_data(chat_id, message_id, **fields)},
+                              self.bot)
+
+    def contact(self, chat_id: int) -> Update:
+        update_id, message_id = self.next_ids()
+        contact = {'phone_number': f'+7900{chat_id:07d}', 'first_name': f'Имя{chat_id}', 'user_id': chat_id}
+        return Update.de_json(
+            {'update_id': update_id, 'message': self.message_data(chat_id, message_id, contact=contact)}, self.bot
+        )
+
+    def callback(self, chat_id: int, data: str) -> Update:
+        update_id, message_id = self.next_ids()
+        return Update.de_json({
+            'update_id': update_id,
+            'callback_query': {
+                'id': str(update_id),
+                'from': self.user(chat_id),
+                'chat_instance': str(chat_id),
+                'data': data,
+                'message': self.message_data(chat_id, message_id, text='Результаты поиска')
+            }
+        }, self.bot)
+
+
+def typo(station: str, generator: random.Random) -> str:
+    position = generator.randrange(1, len(station) - 1)
+    return (station[:position] + station[position + 1:]).lower()
+
+
+def scenario_updates(scenario: str, chat_id: int, factory: UpdateFactory, generator: random.Random) -> list[Update]:
+    updates = [factory.text(chat_id, '/start')]
+    station = generator.choice(STATIONS)
+    if scenario == 'metro':
+        updates.append(factory.text(chat_id, station))
+    elif scenario == 'typo':
+        updates.append(factory.text(chat_id, typo(station, generator)))
+    elif scenario == 'wizard':
+        updates += [
+            factory.text(chat_id, PICK_GROUP_TEXT),
+            factory.text(chat_id, generator.choice(DAYS)),
+            factory.text(chat_id, generator.choice(AGES)),
+            factory.text(chat_id, generator.choice(WIZARD_TYPES)),
+            factory.text(chat_id, 'Посмотреть результат')
+        ]
+    elif scenario == 'join':
+        groups = find_by_metro(station)
+        updates.append(factory.text(chat_id, station))
+        if groups:
+            updates += [
+                factory.callback(chat_id, f'join:{generator.choice(groups).id}'),
+                factory.contact(chat_id)
+            ]
+    return updates
+
+
+def build_streams(users: int, factory: UpdateFactory, seed: int) -> tuple[list[list[Update]], Counter[str]]:
+    generator = random.Random(seed)
+    scenarios = list(SCENARIO_WEIGHTS)
+    weights = list(SCENARIO_WEIGHTS.values())
+    streams = []
+    picked: Counter[str] = Counter()
+    for number in range(users):
+        scenario = generator.choices(scenarios, weights)[0]
+        picked[scenario] += 1
+        streams.append(scenario_updates(scenario, FIRST_CHAT_ID + number, factory, generator))
+    return streams, picked
+
+
+async def replay(application: BenchmarkApplication, streams: list[list[Update]], rate: float) -> None:
+    position = 0
+    while True:
+        batch = [stream[position] for stream in streams if position < len(stream)]
+        if not batch:
+            break
+        for update in batch:
+            await application.enqueue(update)
+            if rate:
+                await asyncio.sleep(1 / rate)
+        position += 1
+    await application.update_queue.join()
+
+
+def print_report(application: BenchmarkApplication, api: FakeBotApi, picked: Counter[str], elapsed: float) -> None:
+    stats = application.stats
+    updates = len(stats.update_latencies)
+    print(f'Сценарии: {dict(picked)}')
+    print(f'Обновлений: {updates}, время: {elapsed:.2f} с, пропускная способность: {updates / elapsed:.1f} обн/с')
+    print(f'Задержка обновления: p50 {percentile(stats.update_latencies, 0.5) * 1000:.1f} мс, '
+          f'p99 {percentile(stats.update_latencies, 0.99) * 1000:.1f} мс')
+    print(f'SQL-запросов на обновление: {sum(stats.update_queries.values()) / max(updates, 1):.2f}')
+    print(f'{"обработчик":<32}{"вызовов":>9}{"p50, мс":>10}{"p99, мс":>10}{"SQL/вызов":>11}')
+    for name, latencies in sorted(stats.handler_latencies.items()):
+        print(f'{name:<32}{len(latencies):>9}{percentile(latencies, 0.5) * 1000:>10.1f}'
+              f'{percentile(latencies, 0.99) * 1000:>10.1f}{stats.handler_queries[name] / len(latencies):>11.2f}')
+    print(f'Фоновые SQL-запросы: {stats.handler_queries[BACKGROUND_HANDLER]}')
+    print(f'Вызовы Bot API: {dict(api.calls)}')
+
+
+async def run(args: argparse.Namespace) -> None:
+    api = FakeBotApi(port=args.api_port, latency=args.api_latency)
+    await api.start()
+    instrument_database()
+    await database_init()
+    await load_catalog()
+
+    builder = ApplicationBuilder() \
+        .token(BENCHMARK_TOKEN) \
+        .base_url(api.base_url) \
+        .updater(None) \
+        .persistence(PostgresPersistence()) \
+        .concurrent_updates(args.concurrency) \
+        .application_class(BenchmarkApplication)
+    if args.no_pacing:
+        builder.rate_limiter(SendScheduler(
+            global_rate=UNPACED_SEND_RATE, private_chat_rate=UNPACED_SEND_RATE, group_chat_rate=UNPACED_SEND_RATE
+        ))
+    else:
+        builder.rate_limiter(SendScheduler())
+    application: BenchmarkApplication = builder.build()
+    handlers_register(application)
+    instrument_application(application)
+    for handlers in application.handlers.values():
+        for handler in handlers:
+            instrument_handler(handler, application.stats.timed)
+    event.listen(engine.sync_engine, 'after_cursor_execute', application.stats.count_query)
+
+    async with application:
+        await application.start()
+        streams, picked = build_streams(args.users, UpdateFactory(application.bot), args.seed)
+        started = time.perf_counter()
+        await replay(application, streams, args.rate)
+        elapsed = time.perf_counter() - started
+        await application.stop()
+    await api.stop()
+    print_report(application, api, picked, elapsed)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.WARNING)
+    parser = argparse.ArgumentParser(
+        description='Прогоняет синтетический поток обновлений через handlers_register',
+        epilog='Нужны переменные окружения: ' + ', '.join(REQUIRED_ENV) + '. База заполняется benchmarks.seed'
+    )
+    parser.add_argument('--users', type=int, default=500, help='количество пользователей-сценариев')
+    parser.add_argument('--rate', type=float, default=0, help='обновлений в секунду, 0 - без ограничения')
+    parser.add_argument('--concurrency', type=int, default=32, help='параллельно обрабатываемых обновлений')
+    parser.add_argument('--no-pacing', action='store_true', help='снять лимиты SendScheduler на отправку')
+    parser.add_argument('--api-port', type=int, default=8081)
+    parser.add_argument('--api-latency', type=float, default=0, help='задержка фейкового Bot API, с')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    missing = [name for name in REQUIRED_ENV if not os.getenv(name)]
+    if missing:
+        parser.error('не заданы переменные окружения: ' + ', '.join(missing))
+    asyncio.run(run(args))
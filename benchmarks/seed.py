@@ -0,0 +1,107 @@
+import argparse
+import asyncio
+import logging
+import random
+from datetime import time
+
+from sqlalchemy import insert, text
+
+from database.connection import async_session, database_init
+from database.entities import Group, GroupLeader, RegionLeader
+
+STATIONS = [
+    'Авиамоторная', 'Автозаводская', 'Академическая', 'Алексеевская', 'Алтуфьево', 'Аннино', 'Арбатская',
+    'Аэропорт', 'Бабушкинская', 'Багратионовская', 'Баррикадная', 'Бауманская', 'Беговая', 'Беляево',
+    'Бибирево', 'Братиславская', 'Бульвар Дмитрия Донского', 'Бутырская', 'ВДНХ', 'Варшавская', 'Водный стадион',
+    'Войковская', 'Волжская', 'Воробьёвы горы', 'Выхино', 'Динамо', 'Дмитровская', 'Добрынинская', 'Домодедовская',
+    'Дубровка', 'Жулебино', 'Измайловская', 'Калужская', 'Кантемировская', 'Каховская', 'Киевская', 'Китай-город',
+    'Кожуховская', 'Коломенская', 'Комсомольская', 'Коньково', 'Красногвардейская', 'Красносельская',
+    'Крылатское', 'Кузьминки', 'Кунцевская', 'Курская', 'Кутузовская', 'Ленинский проспект', 'Лубянка',
+    'Марьино', 'Медведково', 'Менделеевская', 'Митино', 'Молодёжная', 'Новогиреево', 'Новослободская',
+    'Октябрьская', 'Орехово', 'Отрадное', 'Парк культуры', 'Партизанская', 'Первомайская', 'Перово',
+    'Планерная', 'Полежаевская', 'Преображенская площадь', 'Пролетарская', 'Профсоюзная', 'Пушкинская',
+    'Речной вокзал', 'Рижская', 'Савёловская', 'Семёновская', 'Сокол', 'Сокольники', 'Спортивная', 'Строгино',
+    'Таганская', 'Тверская', 'Тёплый Стан', 'Текстильщики', 'Тимирязевская', 'Тульская', 'Тушинская',
+    'Улица 1905 года', 'Университет', 'Филёвский парк', 'Фрунзенская', 'Царицыно', 'Цветной бульвар',
+    'Черкизовская', 'Чертановская', 'Чистые пруды', 'Шаболовская', 'Щёлковская', 'Щукинская', 'Электрозаводская',
+    'Юго-Западная', 'Южная', 'Ясенево'
+]
+DAYS = ['Понедельник', 'Вторник', 'Среда', 'Четверг', 'Пятница', 'Суббота', 'Воскресенье']
+AGES = ['Взрослые', 'Молодежные (до 25)', 'Молодежные (после 25)']
+TYPES = ['Общая', 'Мужская', 'Женская', 'Семейная', 'Благовестие', 'Израильская', 'Англоязычная']
+TIMES = [time(hour, minute) for hour in range(10, 22) for minute in (0, 30)]
+LEADER_TELEGRAM_ID_BASE = 500000000
+REGION_TELEGRAM_ID_BASE = 600000000
+SEEDED_TABLES = ['join_requests', 'sheet_outbox', 'notification_outbox', 'groups', 'group_leaders',
+                 'regional_leaders', 'users', 'bot_state']
+
+
+async def truncate_tables() -> None:
+    async with async_session() as session:
+        async with session.begin():
+            tables = ', '.join(f'{Group.metadata.schema}.{table}' if Group.metadata.schema else table
+                               for table in SEEDED_TABLES)
+            await session.execute(text(f'TRUNCATE {tables} RESTART IDENTITY CASCADE'))
+
+
+async def seed_catalog(groups_count: int, leaders_count: int, regions_count: int, seed: int = 1) -> None:
+    generator = random.Random(seed)
+    regions = [
+        {
+            'name': f'Региональный лидер {number}',
+            'telegram_id': REGION_TELEGRAM_ID_BASE + number,
+            'telegram_login': f'region_{number}'
+        }
+        for number in range(1, regions_count + 1)
+    ]
+    leaders = [
+        {
+            'name': f'Лидер {number}',
+            'telegram_id': LEADER_TELEGRAM_ID_BASE + number if generator.random() < 0.9 else None,
+            'telegram_login': f'leader_{number}',
+            'region_leader_id': generator.randint(1, regions_count)
+        }
+        for number in range(1, leaders_count + 1)
+    ]
+    identities = set()
+    groups = []
+    while len(groups) < groups_count:
+        group = {
+            'metro': generator.choice(STATIONS),
+            'day': generator.choice(DAYS),
+            'time': generator.choice(TIMES),
+            'age': generator.choice(AGES),
+            'type': generator.choice(TYPES),
+            'is_open': generator.random() < 0.95,
+            'leader_id': generator.randint(1, leaders_count)
+        }
+        identity = tuple(value for key, value in group.items() if key != 'is_open')
+        if identity in identities:
+            continue
+        identities.add(identity)
+        groups.append(group)
+
+    async with async_session() as session:
+        async with session.begin():
+            await session.execute(insert(RegionLeader), regions)
+            await session.execute(insert(GroupLeader), leaders)
+            await session.execute(insert(Group), groups)
+    logging.info('Создано регионов: %s, лидеров: %s, групп: %s', regions_count, leaders_count, groups_count)
+
+
+async def seed(groups_count: int, leaders_count: int, regions_count: int, truncate: bool) -> None:
+    await database_init()
+    if truncate:
+        await truncate_tables()
+    await seed_catalog(groups_count, leaders_count, regions_count)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description='Заполняет базу синтетическим каталогом групп для бенчмарков')
+    parser.add_argument('--groups', type=int, default=5000)
+    parser.add_argument('--leaders', type=int, default=1500)
+    parser.add_argument('--regions', type=int, default=30)
+    parser.add_argument('--truncate', action='store_true', help='очистить таблицы перед заполнением')
+    args = parser.parse_args()
+    asyncio.run(seed(args.groups, args.leaders, args.regions, args.truncate))
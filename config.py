@@ -1,8 +1,74 @@
+import atexit
+import contextvars
+import json
 import logging
+import os
+import queue
+import random
+import sys
+from logging.handlers import QueueHandler, QueueListener
+
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'json')
+LOG_DEBUG_SAMPLE_RATE = float(os.getenv('LOG_DEBUG_SAMPLE_RATE', '0.1'))
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - [%(correlation_id)s] %(message)s'
+
+correlation_id: contextvars.ContextVar[int | None] = contextvars.ContextVar('correlation_id', default=None)
+
+
+class CorrelationFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        current = correlation_id.get()
+        if current is not None:
+            record.correlation_id = current
+        return True
+
+
+class DebugSamplingFilter(logging.Filter):
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG or self.rate >= 1:
+            return True
+        current = getattr(record, 'correlation_id', None)
+        if current is None:
+            return random.random() < self.rate
+        return current % 1000 < self.rate * 1000
+
+
+class DeferredQueueHandler(QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage()
+        }
+        if getattr(record, 'correlation_id', None) is not None:
+            entry['correlation_id'] = record.correlation_id
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
 
 
 def logging_init():
-    logging.basicConfig(
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        level=logging.INFO
-    )
+    output = logging.StreamHandler(sys.stdout)
+    if LOG_FORMAT == 'json':
+        output.setFormatter(JsonFormatter())
+    else:
+        output.setFormatter(logging.Formatter(TEXT_FORMAT, defaults={'correlation_id': '-'}))
+    log_queue = queue.SimpleQueue()
+    handler = DeferredQueueHandler(log_queue)
+    handler.addFilter(CorrelationFilter())
+    handler.addFilter(DebugSamplingFilter(LOG_DEBUG_SAMPLE_RATE))
+    logging.basicConfig(level=LOG_LEVEL, handlers=[handler], force=True)
+    listener = QueueListener(log_queue, output)
+    listener.start()
+    atexit.register(listener.stop)
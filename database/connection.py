@@ -1,28 +1,81 @@
+import asyncio
+import logging
 import os
+from contextlib import asynccontextmanager
 
 import asyncpg
+from sqlalchemy import select, func
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncEngine, AsyncSession
 
 from database.entities import Base
+from database.migrations import run_migrations
+
+DB_ECHO = os.getenv('DB_ECHO', 'false').lower() == 'true'
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '10'))
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', '10'))
+DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', '1800'))
+DB_STATEMENT_CACHE_SIZE = int(os.getenv('DB_STATEMENT_CACHE_SIZE', '500'))
+WOL_DB_POOL_SIZE = int(os.getenv('WOL_DB_POOL_SIZE', '2'))
 
 engine: AsyncEngine = create_async_engine(
     os.getenv('DB_CONNECTION_STRING'),
-    echo=True
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_recycle=DB_POOL_RECYCLE,
+    pool_pre_ping=True,
+    connect_args={'prepared_statement_cache_size': DB_STATEMENT_CACHE_SIZE}
 )
 
 async_session: async_sessionmaker[AsyncSession] = async_sessionmaker(engine, expire_on_commit=False)
 
+_wolrus_pool: asyncpg.Pool | None = None
+_wolrus_pool_lock = asyncio.Lock()
+
+
+def set_sql_echo(enabled: bool) -> None:
+    logging.getLogger('sqlalchemy.engine').setLevel(logging.INFO if enabled else logging.WARNING)
+
+
+set_sql_echo(DB_ECHO)
+
+
+def database_dsn() -> str:
+    return engine.url.set(drivername='postgresql').render_as_string(hide_password=False)
+
+
+@asynccontextmanager
+async def advisory_lock(key: int, wait: bool = True):
+    async with engine.connect() as connection:
+        connection = await connection.execution_options(isolation_level='AUTOCOMMIT')
+        if wait:
+            await connection.execute(select(func.pg_advisory_lock(key)))
+            acquired = True
+        else:
+            acquired = await connection.scalar(select(func.pg_try_advisory_lock(key)))
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                await connection.execute(select(func.pg_advisory_unlock(key)))
+
 
-async def get_wolrus_connection():
-    return await asyncpg.connect(
-        host=os.getenv('WOL_DB_HOST'),
-        database=os.getenv('WOL_DB_NAME'),
-        user=os.getenv('WOL_DB_USER'),
-        password=os.getenv('WOL_DB_PASSWORD'),
-        port=os.getenv('WOL_DB_PORT')
-    )
+async def get_wolrus_pool() -> asyncpg.Pool:
+    global _wolrus_pool
+    async with _wolrus_pool_lock:
+        if _wolrus_pool is None:
+            _wolrus_pool = await asyncpg.create_pool(
+                host=os.getenv('WOL_DB_HOST'),
+                database=os.getenv('WOL_DB_NAME'),
+                user=os.getenv('WOL_DB_USER'),
+                password=os.getenv('WOL_DB_PASSWORD'),
+                port=os.getenv('WOL_DB_PORT'),
+                min_size=0,
+                max_size=WOL_DB_POOL_SIZE
+            )
+    return _wolrus_pool
 
 
 async def database_init() -> None:
     async with engine.begin() as connection:
         await connection.run_sync(Base.metadata.create_all)
+        await connection.run_sync(run_migrations)
@@ -2,7 +2,8 @@ import os
 from datetime import datetime, time
 from typing import List
 
-from sqlalchemy import String, Boolean, DateTime, Integer, Time, ForeignKey, MetaData, BigInteger
+from sqlalchemy import String, Boolean, DateTime, Integer, Time, ForeignKey, MetaData, BigInteger, Index, JSON, \
+    Text, text, LargeBinary
 from sqlalchemy.ext.asyncio import AsyncAttrs
 from sqlalchemy.orm import Mapped, mapped_column, DeclarativeBase, relationship
 
@@ -15,6 +16,9 @@ class Base(AsyncAttrs, DeclarativeBase):
 
 class User(Base):
     __tablename__ = 'users'
+    __table_args__ = (
+        Index('ux_users_telegram_id', 'telegram_id', unique=True),
+    )
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     first_name: Mapped[str] = mapped_column(String(length=255), nullable=True)
     last_name: Mapped[str] = mapped_column(String(length=255), nullable=True)
@@ -26,6 +30,10 @@ class User(Base):
 
 class GroupLeader(Base):
     __tablename__ = 'group_leaders'
+    __table_args__ = (
+        Index('ux_group_leaders_name', 'name', unique=True),
+        Index('ix_group_leaders_telegram_login', 'telegram_login'),
+    )
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     name: Mapped[str] = mapped_column(String(length=255), nullable=False)
     telegram_id: Mapped[int] = mapped_column(BigInteger, nullable=True)
@@ -37,6 +45,11 @@ class GroupLeader(Base):
 
 class Group(Base):
     __tablename__ = 'groups'
+    __table_args__ = (
+        Index('ux_groups_identity', 'metro', 'day', 'time', 'age', 'type', 'leader_id', unique=True),
+        Index('ix_groups_open_filter', 'day', 'age', 'type', postgresql_where=text('is_open')),
+        Index('ix_groups_open_metro', 'metro', postgresql_where=text('is_open')),
+    )
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     metro: Mapped[str] = mapped_column(String(length=255), nullable=False)
     day: Mapped[str] = mapped_column(String(length=255), nullable=False)
@@ -50,6 +63,10 @@ class Group(Base):
 
 class RegionLeader(Base):
     __tablename__ = 'regional_leaders'
+    __table_args__ = (
+        Index('ux_regional_leaders_name', 'name', unique=True),
+        Index('ix_regional_leaders_telegram_login', 'telegram_login'),
+    )
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     name: Mapped[str] = mapped_column(String(length=255), nullable=False)
     telegram_id: Mapped[int] = mapped_column(BigInteger, nullable=True)
@@ -63,3 +80,55 @@ class JoinRequest(Base):
     request_date: Mapped[datetime] = mapped_column(DateTime, default=datetime.now())
     user_id: Mapped[int] = mapped_column(ForeignKey('users.id'), nullable=True)
     leader_id: Mapped[int] = mapped_column(ForeignKey('group_leaders.id'), nullable=True)
+
+
+class HubFingerprint(Base):
+    __tablename__ = 'hub_fingerprints'
+    fingerprint: Mapped[str] = mapped_column(String(length=64), primary_key=True)
+
+
+class SheetOutbox(Base):
+    __tablename__ = 'sheet_outbox'
+    __table_args__ = (
+        Index('ix_sheet_outbox_pending', 'id', postgresql_where=text('sent_at IS NULL')),
+    )
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    worksheet: Mapped[str] = mapped_column(String(length=255), nullable=False)
+    values: Mapped[list[str]] = mapped_column(JSON, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now)
+    sent_at: Mapped[datetime] = mapped_column(DateTime, nullable=True)
+    attempts: Mapped[int] = mapped_column(Integer, default=0)
+    claimed_until: Mapped[datetime] = mapped_column(DateTime, nullable=True)
+
+
+class NotificationOutbox(Base):
+    __tablename__ = 'notification_outbox'
+    __table_args__ = (
+        Index('ix_notification_outbox_pending', 'id', postgresql_where=text('sent_at IS NULL')),
+    )
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    chat_id: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    text: Mapped[str] = mapped_column(Text, nullable=True)
+    parse_mode: Mapped[str] = mapped_column(String(length=32), nullable=True)
+    phone_number: Mapped[str] = mapped_column(String(length=255), nullable=True)
+    contact_first_name: Mapped[str] = mapped_column(String(length=255), nullable=True)
+    contact_last_name: Mapped[str] = mapped_column(String(length=255), nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now)
+    next_attempt_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now)
+    sent_at: Mapped[datetime] = mapped_column(DateTime, nullable=True)
+    attempts: Mapped[int] = mapped_column(Integer, default=0)
+
+
+class SchemaMigration(Base):
+    __tablename__ = 'schema_migrations'
+    version: Mapped[int] = mapped_column(Integer, primary_key=True)
+    name: Mapped[str] = mapped_column(String(length=255), nullable=False)
+    applied_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now)
+
+
+class BotState(Base):
+    __tablename__ = 'bot_state'
+    kind: Mapped[str] = mapped_column(String(length=32), primary_key=True)
+    key: Mapped[str] = mapped_column(String(length=255), primary_key=True)
+    data: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now)
@@ -0,0 +1,121 @@
+import itertools
+import logging
+from typing import Callable
+
+from sqlalchemy import Connection, Index, Table, Column, ColumnElement, select, insert, update, delete, func, tuple_, \
+    text
+
+from database.entities import Base, SchemaMigration, User, GroupLeader, Group, RegionLeader, JoinRequest, SheetOutbox
+
+Migration = Callable[[Connection], None]
+
+
+def add_columns(table: Table, *names: str) -> Migration:
+    def migration(connection: Connection) -> None:
+        for name in names:
+            column = table.c[name]
+            connection.execute(text(
+                f'ALTER TABLE {table.fullname} ADD COLUMN IF NOT EXISTS {column.name} '
+                f'{column.type.compile(connection.dialect)}'
+            ))
+    return migration
+
+
+def migration_steps(*steps: Migration) -> Migration:
+    def migration(connection: Connection) -> None:
+        for step in steps:
+            step(connection)
+    return migration
+
+
+def merge_duplicates(table: Table, keys: list[str], references: list[Column] = (), fill: list[str] = (),
+                     keep_first: list[ColumnElement] = ()) -> Migration:
+    def migration(connection: Connection) -> None:
+        key_columns = [table.c[key] for key in keys]
+        duplicated = select(*key_columns) \
+            .where(*(column.isnot(None) for column in key_columns)) \
+            .group_by(*key_columns) \
+            .having(func.count() > 1)
+        rows = connection.execute(
+            select(table).where(tuple_(*key_columns).in_(duplicated)).order_by(*key_columns, *keep_first, table.c.id)
+        ).all()
+        merged = 0
+        for _, group in itertools.groupby(rows, key=lambda row: tuple(row._mapping[key] for key in keys)):
+            kept, *duplicates = group
+            duplicate_ids = [row.id for row in duplicates]
+            values = {
+                name: next((row._mapping[name] for row in (kept, *duplicates) if row._mapping[name] is not None), None)
+                for name in fill
+            }
+            if values:
+                connection.execute(update(table).where(table.c.id == kept.id).values(values))
+            for reference in references:
+                connection.execute(
+                    update(reference.table).where(reference.in_(duplicate_ids)).values({reference.name: kept.id})
+                )
+            connection.execute(delete(table).where(table.c.id.in_(duplicate_ids)))
+            merged += len(duplicate_ids)
+        if merged:
+            logging.warning('Объединено дубликатов в %s: %s', table.name, merged)
+    return migration
+
+
+def create_indexes(*names: str) -> Migration:
+    def migration(connection: Connection) -> None:
+        indexes: dict[str, Index] = {
+            index.name: index for table in Base.metadata.sorted_tables for index in table.indexes
+        }
+        for name in names:
+            indexes[name].create(connection, checkfirst=True)
+    return migration
+
+
+merge_group_leaders = merge_duplicates(
+    GroupLeader.__table__, ['name'],
+    references=[Group.__table__.c.leader_id, JoinRequest.__table__.c.leader_id],
+    fill=['telegram_id', 'telegram_login', 'region_leader_id']
+)
+merge_groups = merge_duplicates(
+    Group.__table__, ['metro', 'day', 'time', 'age', 'type', 'leader_id'],
+    keep_first=[Group.__table__.c.is_open.desc()]
+)
+merge_users = merge_duplicates(
+    User.__table__, ['telegram_id'],
+    references=[JoinRequest.__table__.c.user_id],
+    fill=['first_name', 'last_name', 'telegram_login'],
+    keep_first=[User.__table__.c.last_login.desc().nulls_last()]
+)
+merge_regional_leaders = merge_duplicates(
+    RegionLeader.__table__, ['name'],
+    references=[GroupLeader.__table__.c.region_leader_id],
+    fill=['telegram_id', 'telegram_login']
+)
+
+MIGRATIONS: list[tuple[int, str, Migration]] = [
+    (1, 'import_unique_indexes', migration_steps(
+        merge_group_leaders,
+        merge_groups,
+        create_indexes('ux_group_leaders_name', 'ux_groups_identity')
+    )),
+    (2, 'users_telegram_id_unique_index', migration_steps(merge_users, create_indexes('ux_users_telegram_id'))),
+    (3, 'hot_query_indexes', migration_steps(merge_regional_leaders, create_indexes(
+        'ix_groups_open_filter',
+        'ix_groups_open_metro',
+        'ix_group_leaders_telegram_login',
+        'ux_regional_leaders_name',
+        'ix_regional_leaders_telegram_login',
+        'ix_sheet_outbox_pending',
+        'ix_notification_outbox_pending'
+    ))),
+    (4, 'sheet_outbox_claims', add_columns(SheetOutbox.__table__, 'claimed_until')),
+]
+
+
+def run_migrations(connection: Connection) -> None:
+    applied: set[int] = set(connection.execute(select(SchemaMigration.version)).scalars())
+    for version, name, migration in MIGRATIONS:
+        if version in applied:
+            continue
+        logging.info('Применяем миграцию %s: %s', version, name)
+        migration(connection)
+        connection.execute(insert(SchemaMigration), [{'version': version, 'name': name}])
@@ -1,4 +1,4 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from datetime import time
 
 
@@ -10,14 +10,50 @@ class UserModel:
     telegram_id: int
 
 
-@dataclass
+@dataclass(frozen=True)
 class GroupModel:
     metro: str
     day: str
     time: time
     age: str
     type: str
-    leader_id: int
+    leader_name: str
+
+
+@dataclass
+class ReconciliationDiff:
+    to_open: list[GroupModel]
+    to_close: list[GroupModel]
+
+
+@dataclass
+class ImportReport:
+    inserted: int = 0
+    reopened: int = 0
+    closed: int = 0
+    stage_timings: dict[str, float] = field(default_factory=dict)
+
+
+@dataclass(frozen=True)
+class SheetColumnsModel:
+    table_id: str
+    region: str
+    leader: str
+    telegram: str
+
+
+@dataclass(frozen=True)
+class LeaderInfoModel:
+    group_leader_name: str
+    regional_leader_name: str
+    telegram_login: str | None
+
+
+@dataclass
+class ContactModel:
+    phone_number: str
+    first_name: str
+    last_name: str
 
 
 @dataclass
@@ -41,3 +77,22 @@ class JoinModel:
             self.leader_name,
             self.district_leader,
         ]
+
+
+@dataclass(frozen=True)
+class CatalogGroupModel:
+    id: int
+    metro: str
+    day: str
+    time: time
+    age: str
+    type: str
+    leader_id: int
+    leader_name: str
+
+
+@dataclass(frozen=True, slots=True)
+class GroupCardModel:
+    group_id: int
+    text: str
+    is_youth: bool
@@ -0,0 +1,194 @@
+import asyncio
+import json
+import logging
+import pickle
+from datetime import datetime
+
+from sqlalchemy import select, delete, tuple_, or_, ColumnElement
+from sqlalchemy.dialects import postgresql
+from telegram.ext import BasePersistence, PersistenceInput
+
+from database.connection import async_session
+from database.entities import BotState
+
+USER_DATA_KIND = 'user_data'
+CHAT_DATA_KIND = 'chat_data'
+CONVERSATION_KIND = 'conversation'
+
+ConversationKey = tuple[int | str, ...]
+ConversationDict = dict[ConversationKey, object]
+StateKey = tuple[str, str]
+
+
+def conversation_key(name: str, key: ConversationKey) -> str:
+    return f'{name}:{json.dumps(list(key))}'
+
+
+def replace_data(data: dict, new_data: dict | None) -> None:
+    data.clear()
+    data.update(new_data or {})
+
+
+class PostgresPersistence(BasePersistence[dict, dict, dict]):
+    def __init__(self, update_interval: float = 60, shared_state: bool = False):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, callback_data=False),
+            update_interval=update_interval
+        )
+        self.shared_state = shared_state
+        self._pending: dict[StateKey, bytes | None] = {}
+        self._versions: dict[StateKey, datetime] = {}
+        self._flush_task: asyncio.Task | None = None
+
+    async def _load(self, kind: str) -> dict[str, object]:
+        async with async_session() as session:
+            result = await session.execute(
+                select(BotState.key, BotState.data, BotState.updated_at).where(BotState.kind == kind)
+            )
+            loaded = {}
+            for key, data, updated_at in result.all():
+                self._versions[(kind, key)] = updated_at
+                loaded[key] = pickle.loads(data)
+            return loaded
+
+    async def _refresh(self, kind: str, condition: ColumnElement[bool], known_keys: list[str]) -> dict[str, object]:
+        async with async_session() as session:
+            result = await session.execute(
+                select(BotState.key, BotState.data, BotState.updated_at).where(BotState.kind == kind, condition)
+            )
+            rows = result.all()
+        changed: dict[str, object] = {
+            key: None for key in known_keys if (kind, key) in self._versions and (kind, key) not in self._pending
+        }
+        for key, data, updated_at in rows:
+            changed.pop(key, None)
+            if (kind, key) in self._pending or self._versions.get((kind, key)) == updated_at:
+                continue
+            self._versions[(kind, key)] = updated_at
+            changed[key] = pickle.loads(data)
+        for key, data in changed.items():
+            if data is None:
+                del self._versions[(kind, key)]
+        return changed
+
+    async def _stage(self, kind: str, key: str, data: object) -> None:
+        self._pending[(kind, key)] = None if data is None else pickle.dumps(data)
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_pending())
+        await asyncio.shield(self._flush_task)
+
+    async def _flush_pending(self) -> None:
+        await asyncio.sleep(0)
+        pending, self._pending = self._pending, {}
+        self._flush_task = None
+        if not pending:
+            return
+        now = datetime.now()
+        upserts = [
+            {'kind': kind, 'key': key, 'data': data, 'updated_at': now}
+            for (kind, key), data in pending.items() if data is not None
+        ]
+        deletes = [(kind, key) for (kind, key), data in pending.items() if data is None]
+        try:
+            async with async_session() as session:
+                async with session.begin():
+                    if upserts:
+                        statement = postgresql.insert(BotState.__table__)
+                        await session.execute(
+                            statement.on_conflict_do_update(
+                                index_elements=['kind', 'key'],
+                                set_={'data': statement.excluded.data, 'updated_at': statement.excluded.updated_at}
+                            ),
+                            upserts
+                        )
+                    if deletes:
+                        await session.execute(
+                            delete(BotState).where(tuple_(BotState.kind, BotState.key).in_(deletes))
+                        )
+        except Exception:
+            self._pending = {**pending, **self._pending}
+            raise
+        for upsert in upserts:
+            self._versions[(upsert['kind'], upsert['key'])] = now
+        for state_key in deletes:
+            self._versions.pop(state_key, None)
+        logging.debug('Сохранено состояние бота: обновлено %d, удалено %d', len(upserts), len(deletes))
+
+    async def get_user_data(self) -> dict[int, dict]:
+        return {int(key): data for key, data in (await self._load(USER_DATA_KIND)).items()}
+
+    async def get_chat_data(self) -> dict[int, dict]:
+        return {int(key): data for key, data in (await self._load(CHAT_DATA_KIND)).items()}
+
+    async def get_bot_data(self) -> dict:
+        return {}
+
+    async def get_callback_data(self) -> None:
+        return None
+
+    async def get_conversations(self, name: str) -> ConversationDict:
+        prefix = f'{name}:'
+        return {
+            tuple(json.loads(key[len(prefix):])): state
+            for key, state in (await self._load(CONVERSATION_KIND)).items() if key.startswith(prefix)
+        }
+
+    async def update_conversation(self, name: str, key: ConversationKey, new_state: object | None) -> None:
+        await self._stage(CONVERSATION_KIND, conversation_key(name, key), new_state)
+
+    async def update_user_data(self, user_id: int, data: dict) -> None:
+        await self._stage(USER_DATA_KIND, str(user_id), data)
+
+    async def update_chat_data(self, chat_id: int, data: dict) -> None:
+        await self._stage(CHAT_DATA_KIND, str(chat_id), data)
+
+    async def update_bot_data(self, data: dict) -> None:
+        pass
+
+    async def update_callback_data(self, data: object) -> None:
+        pass
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        await self._stage(CHAT_DATA_KIND, str(chat_id), None)
+
+    async def drop_user_data(self, user_id: int) -> None:
+        await self._stage(USER_DATA_KIND, str(user_id), None)
+
+    async def refresh_user_data(self, user_id: int, user_data: dict) -> None:
+        if self.shared_state:
+            key = str(user_id)
+            changed = await self._refresh(USER_DATA_KIND, BotState.key == key, [key])
+            if key in changed:
+                replace_data(user_data, changed[key])
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict) -> None:
+        if self.shared_state:
+            key = str(chat_id)
+            changed = await self._refresh(CHAT_DATA_KIND, BotState.key == key, [key])
+            if key in changed:
+                replace_data(chat_data, changed[key])
+
+    async def refresh_conversations(self, chat_id: int, conversations: dict[str, ConversationDict]) -> None:
+        if not self.shared_state:
+            return
+        for name, states in conversations.items():
+            prefix = f'{name}:[{chat_id}'
+            changed = await self._refresh(
+                CONVERSATION_KIND,
+                or_(BotState.key == f'{prefix}]', BotState.key.startswith(f'{prefix},', autoescape=True)),
+                [conversation_key(name, key) for key in states if key and key[0] == chat_id]
+            )
+            for key, state in changed.items():
+                conversation = tuple(json.loads(key[len(name) + 1:]))
+                if state is None:
+                    states.pop(conversation, None)
+                else:
+                    states.update_no_track({conversation: state})
+
+    async def refresh_bot_data(self, bot_data: dict) -> None:
+        pass
+
+    async def flush(self) -> None:
+        if self._flush_task is not None:
+            await self._flush_task
+        await self._flush_pending()
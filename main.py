@@ -6,12 +6,25 @@ from telegram.ext import ApplicationBuilder, Application, CommandHandler, Messag
 
 from config import logging_init
 from database.connection import database_init
+from database.persistence import PostgresPersistence
+from services.catalog import load_catalog
+from services.cluster import BOT_MODE, WORKER_MODE, FRONT_MODE, run_worker, run_front
+from services.concurrency import CONCURRENT_UPDATES, ChatOrderedApplication
 from services.conversation import conversation_handler
+from services.errors import schedule_error_digest
 from services.handlers import start_handler, import_handler, search_group_handler, return_to_start_handler, \
-    open_group_handler, search_by_button_handler, join_to_group_handler, send_contact_response_handler, error_handler
+    open_group_handler, search_by_button_handler, join_to_group_handler, send_contact_response_handler, error_handler, \
+    metro_suggestion_handler, results_page_handler, expired_results_handler, sql_echo_handler, errors_handler
+from services.import_job import schedule_sync
 from services.keyboard import WRITE_METRO_TEXT
+from services.metrics import instrument_application, instrument_database, start_metrics_server
+from services.notifications import schedule_notifications
+from services.query_plans import log_query_plans
+from services.rate_limiter import SendScheduler
+from services.sheets import schedule_sheet_outbox
 
 TOKEN = os.getenv('BOT_TOKEN')
+PERSISTENCE_INTERVAL = int(os.getenv('PERSISTENCE_INTERVAL', '10'))
 
 
 def handlers_register(application: Application) -> None:
@@ -20,21 +33,40 @@ def handlers_register(application: Application) -> None:
     application.add_handler(CallbackQueryHandler(return_to_start_handler, pattern='return_to_start'))
     application.add_handler(CallbackQueryHandler(open_group_handler, pattern='open_group'))
     application.add_handler(MessageHandler(filters.Text([WRITE_METRO_TEXT]), search_by_button_handler))
-    application.add_handler(CallbackQueryHandler(join_to_group_handler, pattern='join_to_group'))
+    application.add_handler(CallbackQueryHandler(join_to_group_handler, pattern='^join:'))
+    application.add_handler(CallbackQueryHandler(expired_results_handler, pattern='^join_to_group$'))
+    application.add_handler(CallbackQueryHandler(metro_suggestion_handler, pattern='^metro:'))
+    application.add_handler(CallbackQueryHandler(results_page_handler, pattern='^page:'))
     application.add_handler(MessageHandler(filters.Text(['Вернуться']), return_to_start_handler))
     application.add_handler(MessageHandler(filters.CONTACT, send_contact_response_handler))
     application.add_handler(CommandHandler('import', import_handler))
+    application.add_handler(CommandHandler('sqlecho', sql_echo_handler))
+    application.add_handler(CommandHandler('errors', errors_handler))
     application.add_handler(MessageHandler(filters.TEXT, search_group_handler))
     application.add_error_handler(error_handler)
 
 
 def main() -> None:
-    application: Application = ApplicationBuilder() \
+    builder: ApplicationBuilder = ApplicationBuilder() \
         .token(TOKEN) \
         .read_timeout(300) \
         .write_timeout(300) \
-        .build()
+        .persistence(PostgresPersistence(update_interval=PERSISTENCE_INTERVAL, shared_state=BOT_MODE == WORKER_MODE)) \
+        .concurrent_updates(CONCURRENT_UPDATES) \
+        .application_class(ChatOrderedApplication) \
+        .rate_limiter(SendScheduler())
+    if BOT_MODE == WORKER_MODE:
+        builder.updater(None)
+    application: Application = builder.build()
     handlers_register(application)
+    instrument_application(application)
+    schedule_sync(application)
+    schedule_sheet_outbox(application)
+    schedule_notifications(application)
+    schedule_error_digest(application)
+    if BOT_MODE == WORKER_MODE:
+        asyncio.get_event_loop().run_until_complete(run_worker(application))
+        return
     application.run_webhook(
         listen=os.getenv('LISTEN'),
         port=int(os.getenv('PORT')),
@@ -45,6 +77,13 @@ def main() -> None:
 
 if __name__ == '__main__':
     logging_init()
-    loop: AbstractEventLoop = asyncio.get_event_loop()
-    loop.run_until_complete(database_init())
-    main()
+    if BOT_MODE == FRONT_MODE:
+        run_front()
+    else:
+        instrument_database()
+        start_metrics_server()
+        loop: AbstractEventLoop = asyncio.get_event_loop()
+        loop.run_until_complete(database_init())
+        loop.run_until_complete(load_catalog())
+        loop.run_until_complete(log_query_plans())
+        main()
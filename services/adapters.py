@@ -0,0 +1,165 @@
+import asyncio
+import csv
+import os
+from abc import ABC, abstractmethod
+from typing import AsyncIterator
+
+import aiohttp
+import gspread
+from oauth2client.service_account import ServiceAccountCredentials
+
+from database.connection import get_wolrus_pool
+from database.models import GroupModel
+
+SHEETS_SOURCE = os.getenv('SHEETS_SOURCE', 'http')
+SHEETS_EXPORT_URL = os.getenv('SHEETS_EXPORT_URL', 'https://docs.google.com/spreadsheets/d/{}/export?format=csv&gid={}')
+SHEETS_DIR = os.getenv('SHEETS_DIR', 'sheets')
+JOIN_SINK = os.getenv('JOIN_SINK', 'google')
+JOIN_SINK_DIR = os.getenv('JOIN_SINK_DIR', 'join_requests')
+FILE_CHUNK_SIZE = 64 * 1024
+SPREADSHEET_TITLE = 'Заявки на домашние группы'
+GOOGLE_SCOPE = ['https://www.googleapis.com/auth/spreadsheets', 'https://www.googleapis.com/auth/drive']
+HUB_QUERY = 'SELECT subway, weekday, time_of_hg, type_age, type_of_hg, name_leader ' \
+            'FROM master_data_history_view ' \
+            'WHERE enable_for_site = true'
+
+
+class HubSource(ABC):
+    @abstractmethod
+    async def fetch_groups(self) -> list[GroupModel]:
+        raise NotImplementedError
+
+
+class PostgresHubSource(HubSource):
+    async def fetch_groups(self) -> list[GroupModel]:
+        pool = await get_wolrus_pool()
+        async with pool.acquire() as connection:
+            results = await connection.fetch(HUB_QUERY)
+        return [
+            GroupModel(
+                metro=result.get('subway'),
+                day=result.get('weekday'),
+                time=result.get('time_of_hg'),
+                age=result.get('type_age'),
+                type=result.get('type_of_hg'),
+                leader_name=result.get('name_leader')
+            )
+            for result in results
+        ]
+
+
+class SheetSource(ABC):
+    @abstractmethod
+    def lines(self, sheet_id: str, table_id: str) -> AsyncIterator[str]:
+        raise NotImplementedError
+
+
+class HttpSheetSource(SheetSource):
+    def __init__(self, url_template: str = SHEETS_EXPORT_URL):
+        self.url_template = url_template
+
+    async def lines(self, sheet_id: str, table_id: str) -> AsyncIterator[str]:
+        async with aiohttp.ClientSession() as session:
+            async with session.get(self.url_template.format(sheet_id, table_id)) as response:
+                response.raise_for_status()
+                async for line in response.content:
+                    yield line.decode('utf-8')
+
+
+class FileSheetSource(SheetSource):
+    def __init__(self, directory: str = SHEETS_DIR):
+        self.directory = directory
+
+    def path(self, table_id: str) -> str:
+        return os.path.join(self.directory, f'{table_id}.csv')
+
+    async def lines(self, sheet_id: str, table_id: str) -> AsyncIterator[str]:
+        with open(self.path(table_id), encoding='utf-8', newline='') as file:
+            while chunk := await asyncio.to_thread(file.readlines, FILE_CHUNK_SIZE):
+                for line in chunk:
+                    yield line
+
+
+async def csv_rows(lines: AsyncIterator[str]) -> AsyncIterator[list[str]]:
+    record: list[str] = []
+    quotes = 0
+    first = True
+    async for line in lines:
+        if first:
+            line = line.removeprefix('\ufeff')
+            first = False
+        record.append(line)
+        quotes += line.count('"')
+        if quotes % 2:
+            continue
+        yield next(csv.reader(record), [])
+        record = []
+        quotes = 0
+    if record:
+        yield next(csv.reader(record), [])
+
+
+class JoinSink(ABC):
+    @abstractmethod
+    def append_rows(self, title: str, rows: list[list[str]]) -> None:
+        raise NotImplementedError
+
+    def reset(self) -> None:
+        pass
+
+
+class GoogleSheetSink(JoinSink):
+    def __init__(self, creds_file_path: str = os.path.join(os.getcwd(), 'google_creds.json')):
+        self.creds_file_path = creds_file_path
+        self.spreadsheet: gspread.Spreadsheet | None = None
+        self.worksheets: dict[str, gspread.Worksheet] = {}
+
+    def worksheet(self, title: str) -> gspread.Worksheet:
+        if title not in self.worksheets:
+            if self.spreadsheet is None:
+                credentials = ServiceAccountCredentials.from_json_keyfile_name(self.creds_file_path, GOOGLE_SCOPE)
+                self.spreadsheet = gspread.authorize(credentials).open(SPREADSHEET_TITLE)
+            self.worksheets[title] = self.spreadsheet.worksheet(title)
+        return self.worksheets[title]
+
+    def append_rows(self, title: str, rows: list[list[str]]) -> None:
+        self.worksheet(title).append_rows(rows, value_input_option='USER_ENTERED')
+
+    def reset(self) -> None:
+        self.spreadsheet = None
+        self.worksheets.clear()
+
+
+class CsvJoinSink(JoinSink):
+    def __init__(self, directory: str = JOIN_SINK_DIR):
+        self.directory = directory
+
+    def append_rows(self, title: str, rows: list[list[str]]) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, f'{title}.csv'), 'a', encoding='utf-8', newline='') as file:
+            csv.writer(file).writerows(rows)
+
+
+_hub_source: HubSource = PostgresHubSource()
+_sheet_source: SheetSource = FileSheetSource() if SHEETS_SOURCE == 'file' else HttpSheetSource()
+_join_sink: JoinSink = CsvJoinSink() if JOIN_SINK == 'csv' else GoogleSheetSink()
+
+
+def get_hub_source() -> HubSource:
+    return _hub_source
+
+
+def get_sheet_source() -> SheetSource:
+    return _sheet_source
+
+
+def get_join_sink() -> JoinSink:
+    return _join_sink
+
+
+def use_adapters(hub_source: HubSource | None = None, sheet_source: SheetSource | None = None,
+                 join_sink: JoinSink | None = None) -> None:
+    global _hub_source, _sheet_source, _join_sink
+    _hub_source = hub_source or _hub_source
+    _sheet_source = sheet_source or _sheet_source
+    _join_sink = join_sink or _join_sink
@@ -0,0 +1,191 @@
+import asyncio
+import logging
+import uuid
+from collections import defaultdict
+from dataclasses import dataclass, field
+
+import asyncpg
+from sqlalchemy import select, Select, func
+from sqlalchemy.orm import joinedload
+
+from database.connection import async_session, engine, database_dsn
+from database.entities import Group
+from database.models import CatalogGroupModel, GroupCardModel
+from services.metrics import CATALOG_PAGES_CACHE
+from services.metro_search import StationIndex, build_station_index, match_stations, suggest_stations, station_key
+from services.renderer import ResultPage, build_card, render_pages
+
+ANY_TYPE = 'Любая'
+RESULT_PAGES_CACHE_SIZE = 1024
+CATALOG_CHANNEL = 'catalog_changed'
+LISTENER_RECONNECT_DELAY = 5
+INSTANCE_ID = uuid.uuid4().hex
+GROUP_TYPE_OPTIONS: dict[str, tuple[str, ...] | None] = {
+    'Общая': ('Общая',),
+    'Мужская': ('Мужская',),
+    'Женская': ('Женская',),
+    'Семейная': ('Семейная',),
+    'Тематическая': ('Благовестие', 'Израильская', 'Англоязычная'),
+    ANY_TYPE: None,
+}
+
+
+@dataclass(frozen=True)
+class Catalog:
+    groups: tuple[CatalogGroupModel, ...] = ()
+    by_id: dict[int, CatalogGroupModel] = field(default_factory=dict)
+    by_metro: dict[str, tuple[CatalogGroupModel, ...]] = field(default_factory=dict)
+    by_filter: dict[tuple[str, str, str], tuple[CatalogGroupModel, ...]] = field(default_factory=dict)
+    stations: StationIndex = StationIndex()
+    cards: dict[int, GroupCardModel] = field(default_factory=dict)
+    pages: dict[tuple[int, ...], tuple[ResultPage, ...]] = field(default_factory=dict)
+
+
+_catalog: Catalog = Catalog()
+_background_tasks: set[asyncio.Task] = set()
+_listener: asyncpg.Connection | None = None
+
+
+def build_catalog(groups: tuple[CatalogGroupModel, ...]) -> Catalog:
+    by_metro = defaultdict(list)
+    by_day_age = defaultdict(list)
+    for group in groups:
+        by_metro[group.metro].append(group)
+        by_day_age[(group.day, group.age)].append(group)
+    by_filter = {}
+    for (day, age), day_age_groups in by_day_age.items():
+        for option, group_types in GROUP_TYPE_OPTIONS.items():
+            found_groups = tuple(
+                group for group in day_age_groups if group_types is None or group.type in group_types
+            )
+            if found_groups:
+                by_filter[(day, age, option)] = found_groups
+    return Catalog(
+        groups=groups,
+        by_id={group.id: group for group in groups},
+        by_metro={key: tuple(value) for key, value in by_metro.items()},
+        by_filter=by_filter,
+        stations=build_station_index(by_metro.keys()),
+        cards={group.id: build_card(group) for group in groups}
+    )
+
+
+def open_groups_statement() -> Select:
+    return select(Group).where(Group.is_open).options(joinedload(Group.group_leader)).order_by(Group.id)
+
+
+async def load_catalog() -> Catalog:
+    global _catalog
+    async with async_session() as session:
+        result = await session.execute(open_groups_statement())
+        groups = tuple(
+            CatalogGroupModel(
+                id=group.id,
+                metro=group.metro,
+                day=group.day,
+                time=group.time,
+                age=group.age,
+                type=group.type,
+                leader_id=group.leader_id,
+                leader_name=group.group_leader.name if group.group_leader is not None else ''
+            )
+            for group in result.scalars()
+        )
+    _catalog = build_catalog(groups)
+    logging.info('Загружен каталог открытых групп: %s', len(groups))
+    return _catalog
+
+
+async def notify_catalog_changed() -> None:
+    async with engine.begin() as connection:
+        await connection.execute(select(func.pg_notify(CATALOG_CHANNEL, INSTANCE_ID)))
+
+
+def run_in_background(coroutine) -> None:
+    task = asyncio.create_task(coroutine)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+def on_catalog_changed(connection: asyncpg.Connection, pid: int, channel: str, payload: str) -> None:
+    if payload == INSTANCE_ID:
+        return
+    logging.info('Каталог изменен другим воркером, перезагружаем')
+    run_in_background(load_catalog())
+
+
+def on_listener_terminated(connection: asyncpg.Connection) -> None:
+    global _listener
+    if connection is not _listener:
+        return
+    _listener = None
+    logging.warning('Соединение для уведомлений каталога закрыто, переподключаемся')
+    run_in_background(listen_catalog_changes(LISTENER_RECONNECT_DELAY))
+
+
+async def listen_catalog_changes(delay: float = 0) -> None:
+    global _listener
+    await asyncio.sleep(delay)
+    try:
+        connection: asyncpg.Connection = await asyncpg.connect(database_dsn())
+    except (OSError, asyncpg.PostgresError) as error:
+        logging.warning('Не удалось подписаться на изменения каталога: %s', error)
+        run_in_background(listen_catalog_changes(LISTENER_RECONNECT_DELAY))
+        return
+    _listener = connection
+    connection.add_termination_listener(on_listener_terminated)
+    await connection.add_listener(CATALOG_CHANNEL, on_catalog_changed)
+    await load_catalog()
+
+
+async def stop_listening_catalog_changes() -> None:
+    global _listener
+    connection, _listener = _listener, None
+    for task in list(_background_tasks):
+        task.cancel()
+    if connection is not None:
+        connection.remove_termination_listener(on_listener_terminated)
+        await connection.close()
+
+
+def find_by_metro(metro: str) -> list[CatalogGroupModel]:
+    catalog = _catalog
+    found_groups = []
+    for station in match_stations(catalog.stations, metro):
+        found_groups.extend(catalog.by_metro[station])
+    found_groups.sort(key=lambda group: group.id)
+    return found_groups
+
+
+def find_by_station(key: str) -> list[CatalogGroupModel] | None:
+    catalog = _catalog
+    station = catalog.stations.by_key.get(key)
+    if station is None:
+        return None
+    return list(catalog.by_metro[station])
+
+
+def suggest_metro(metro: str) -> list[tuple[str, str]]:
+    return [(station_key(station), station) for _, station in suggest_stations(_catalog.stations, metro)]
+
+
+def find_by_filter(day: str, age: str, group_type: str) -> list[CatalogGroupModel]:
+    return list(_catalog.by_filter.get((day, age, group_type), ()))
+
+
+def get_card(group_id: int) -> GroupCardModel | None:
+    return _catalog.cards.get(group_id)
+
+
+def result_pages(group_ids: tuple[int, ...]) -> tuple[ResultPage, ...]:
+    catalog = _catalog
+    pages = catalog.pages.get(group_ids)
+    if pages is None:
+        CATALOG_PAGES_CACHE.labels('miss').inc()
+        if len(catalog.pages) >= RESULT_PAGES_CACHE_SIZE:
+            catalog.pages.clear()
+        pages = render_pages([catalog.cards[group_id] for group_id in group_ids if group_id in catalog.cards])
+        catalog.pages[group_ids] = pages
+    else:
+        CATALOG_PAGES_CACHE.labels('hit').inc()
+    return pages
@@ -0,0 +1,89 @@
+import asyncio
+import logging
+import os
+import signal
+
+import aiohttp
+from aiohttp import web
+from telegram import Bot, Update
+from telegram.ext import Application
+
+from services.catalog import listen_catalog_changes, stop_listening_catalog_changes
+
+SINGLE_MODE = 'single'
+FRONT_MODE = 'front'
+WORKER_MODE = 'worker'
+BOT_MODE = os.getenv('BOT_MODE', SINGLE_MODE)
+WORKER_URLS = [url.strip() for url in os.getenv('WORKER_URLS', '').split(',') if url.strip()]
+FORWARD_TIMEOUT = 10
+
+
+def update_partition(data: dict, workers_count: int) -> int:
+    update = Update.de_json(data, None)
+    if update.effective_chat is not None:
+        key = update.effective_chat.id
+    elif update.effective_user is not None:
+        key = update.effective_user.id
+    else:
+        key = update.update_id
+    return key % workers_count
+
+
+async def forward_update(request: web.Request) -> web.Response:
+    data = await request.json()
+    worker_url = WORKER_URLS[update_partition(data, len(WORKER_URLS))]
+    session: aiohttp.ClientSession = request.app['session']
+    try:
+        async with session.post(worker_url, json=data) as response:
+            return web.Response(status=response.status)
+    except (aiohttp.ClientError, asyncio.TimeoutError) as error:
+        logging.error('Не удалось передать обновление воркеру %s: %s', worker_url, error)
+        return web.Response(status=503)
+
+
+async def front_startup(app: web.Application) -> None:
+    app['session'] = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=FORWARD_TIMEOUT))
+    async with Bot(os.getenv('BOT_TOKEN')) as bot:
+        await bot.set_webhook(url=os.getenv('URL'))
+    logging.info('Вебхук установлен, воркеров: %s', len(WORKER_URLS))
+
+
+async def front_cleanup(app: web.Application) -> None:
+    await app['session'].close()
+
+
+def run_front() -> None:
+    if not WORKER_URLS:
+        raise RuntimeError('Для режима front необходимо указать WORKER_URLS')
+    app = web.Application()
+    app.router.add_post('/', forward_update)
+    app.on_startup.append(front_startup)
+    app.on_cleanup.append(front_cleanup)
+    web.run_app(app, host=os.getenv('LISTEN'), port=int(os.getenv('PORT')))
+
+
+async def run_worker(application: Application) -> None:
+    async def receive_update(request: web.Request) -> web.Response:
+        await application.update_queue.put(Update.de_json(await request.json(), application.bot))
+        return web.Response()
+
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for stop_signal in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(stop_signal, stop_event.set)
+
+    app = web.Application()
+    app.router.add_post('/', receive_update)
+    runner = web.AppRunner(app)
+    async with application:
+        await application.start()
+        await listen_catalog_changes()
+        await runner.setup()
+        await web.TCPSite(runner, os.getenv('LISTEN'), int(os.getenv('PORT'))).start()
+        logging.info('Воркер запущен')
+        try:
+            await stop_event.wait()
+        finally:
+            await runner.cleanup()
+            await stop_listening_catalog_changes()
+            await application.stop()
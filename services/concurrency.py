@@ -0,0 +1,71 @@
+import asyncio
+import os
+
+from telegram import Update
+from telegram.ext import Application
+
+from config import correlation_id
+from database.persistence import PostgresPersistence
+
+CONCURRENT_UPDATES = int(os.getenv('CONCURRENT_UPDATES', '32'))
+MAX_PENDING_UPDATES = 1_000_000
+
+
+def update_chat_key(update: object) -> int | None:
+    if not isinstance(update, Update):
+        return None
+    if update.effective_chat is not None:
+        return update.effective_chat.id
+    if update.effective_user is not None:
+        return update.effective_user.id
+    return None
+
+
+class ChatOrderedApplication(Application):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.update_slots = asyncio.BoundedSemaphore(self.concurrent_updates or 1)
+        self._concurrent_updates_sem = asyncio.BoundedSemaphore(MAX_PENDING_UPDATES)
+        self.chat_locks: dict[int, asyncio.Lock] = {}
+        self.chat_waiters: dict[int, int] = {}
+        self.pending_updates = 0
+        self.processing_updates = 0
+
+    @property
+    def queue_depth(self) -> int:
+        return self.update_queue.qsize() + self.pending_updates - self.processing_updates
+
+    async def process_update(self, update: object) -> None:
+        if isinstance(update, Update):
+            correlation_id.set(update.update_id)
+        key = update_chat_key(update)
+        self.pending_updates += 1
+        try:
+            if key is None:
+                await self.process_in_slot(update, key)
+            else:
+                await self.process_in_chat(update, key)
+        finally:
+            self.pending_updates -= 1
+
+    async def process_in_chat(self, update: object, key: int) -> None:
+        lock = self.chat_locks.setdefault(key, asyncio.Lock())
+        self.chat_waiters[key] = self.chat_waiters.get(key, 0) + 1
+        try:
+            async with lock:
+                await self.process_in_slot(update, key)
+        finally:
+            self.chat_waiters[key] -= 1
+            if not self.chat_waiters[key]:
+                del self.chat_waiters[key]
+                del self.chat_locks[key]
+
+    async def process_in_slot(self, update: object, key: int | None) -> None:
+        async with self.update_slots:
+            self.processing_updates += 1
+            try:
+                if key is not None and isinstance(self.persistence, PostgresPersistence):
+                    await self.persistence.refresh_conversations(key, self._conversation_handler_conversations)
+                await super().process_update(update)
+            finally:
+                self.processing_updates -= 1
@@ -1,103 +1,163 @@
 import logging
-import os
 from datetime import datetime
 
-import gspread
-from oauth2client.service_account import ServiceAccountCredentials
-from sqlalchemy import select, insert, Result
+from sqlalchemy import select, insert, update, delete, Result, literal_column, Select, Update, bindparam, func, \
+    Integer
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.dialects.postgresql import Insert
 from sqlalchemy.orm import joinedload
 
 from database.connection import async_session
-from database.entities import User, GroupLeader, Group, RegionLeader, JoinRequest
-from database.models import UserModel, GroupModel, JoinModel
+from database.entities import User, GroupLeader, Group, RegionLeader, JoinRequest, HubFingerprint, \
+    SheetOutbox, NotificationOutbox
+from database.models import UserModel, GroupModel, JoinModel, ImportReport, ContactModel, LeaderInfoModel
+from services.notifications import join_notifications
+from services.sheets import worksheet_title
 
-current_dir = os.getcwd()
-creds_file_path = os.path.join(current_dir, 'google_creds.json')
 
-scope = ['https://www.googleapis.com/auth/spreadsheets', "https://www.googleapis.com/auth/drive"]
-credentials = ServiceAccountCredentials.from_json_keyfile_name(creds_file_path, scope)
+_backfilled_logins: set[str] = set()
+
+
+def user_upsert_statement(user_model: UserModel, now: datetime) -> Insert:
+    return postgresql.insert(User.__table__) \
+        .values(
+            first_name=user_model.first_name,
+            last_name=user_model.last_name,
+            telegram_login=user_model.username,
+            telegram_id=user_model.telegram_id,
+            last_login=now
+        ) \
+        .on_conflict_do_update(index_elements=['telegram_id'], set_={'last_login': now})
+
+
+def leader_backfill_statement(leader_entity: type[GroupLeader | RegionLeader], telegram_login: str,
+                              telegram_id: int) -> Update:
+    return update(leader_entity) \
+        .where(leader_entity.telegram_login == telegram_login) \
+        .where(leader_entity.telegram_id.is_(None)) \
+        .values(telegram_id=telegram_id)
+
+
+def join_target_statement(group_id: int) -> Select:
+    return select(Group) \
+        .where(Group.id == group_id) \
+        .options(joinedload(Group.group_leader).joinedload(GroupLeader.region_leader))
 
 
 async def get_or_create_user(user_model: UserModel) -> None:
     async with async_session() as session:
         async with session.begin():
-            result: Result = await session.execute(select(User).where(User.telegram_id == user_model.telegram_id))
-            user: User = result.scalar_one_or_none()
-            if user is None:
-                await session.execute(insert(User), [{
-                    'first_name': user_model.first_name,
-                    'last_name': user_model.last_name,
-                    'telegram_login': user_model.username,
-                    'telegram_id': user_model.telegram_id
-                }])
-            else:
-                user.last_login = datetime.now()
-
-            group_leader = (await session.execute(
-                select(GroupLeader).where(GroupLeader.telegram_login == user_model.username))).scalars().first()
-            if group_leader is not None and group_leader.telegram_id is None:
-                group_leader.telegram_id = user_model.telegram_id
-
-            regional_leader = (await session.execute(
-                select(RegionLeader).where(RegionLeader.telegram_login == user_model.username))).scalars().first()
-            if regional_leader is not None and regional_leader.telegram_id is None:
-                regional_leader.telegram_id = user_model.telegram_id
-
-
-async def get_or_create_group_leader(name: str) -> GroupLeader:
+            await session.execute(user_upsert_statement(user_model, datetime.now()))
+            if user_model.username and user_model.username not in _backfilled_logins:
+                for leader_entity in (GroupLeader, RegionLeader):
+                    await session.execute(
+                        leader_backfill_statement(leader_entity, user_model.username, user_model.telegram_id)
+                    )
+    if user_model.username:
+        _backfilled_logins.add(user_model.username)
+
+
+def reset_backfilled_logins() -> None:
+    _backfilled_logins.clear()
+
+
+def leaders_info_statement() -> Update:
+    table = GroupLeader.__table__
+    return update(table) \
+        .where(table.c.name == bindparam('b_leader_name')) \
+        .values(
+            region_leader_id=func.coalesce(bindparam('b_region_leader_id', type_=Integer), table.c.region_leader_id),
+            telegram_login=bindparam('b_telegram_login')
+        )
+
+
+async def update_groups_leaders_info(leaders: list[LeaderInfoModel]) -> None:
+    leaders = list({leader.group_leader_name: leader for leader in leaders}.values())
+    region_names = sorted({leader.regional_leader_name for leader in leaders if leader.regional_leader_name})
     async with async_session() as session:
         async with session.begin():
-            result: Result = await session.execute(select(GroupLeader).where(GroupLeader.name == name))
-            group_leader: GroupLeader = result.scalar_one_or_none()
-            if group_leader is None:
-                group_leader = await session.scalar(insert(GroupLeader).returning(GroupLeader), [{'name': name}])
-            return group_leader
+            region_ids: dict[str, int] = {}
+            if region_names:
+                await session.execute(
+                    postgresql.insert(RegionLeader.__table__).on_conflict_do_nothing(index_elements=['name']),
+                    [{'name': name} for name in region_names]
+                )
+                result: Result = await session.execute(
+                    select(RegionLeader.name, RegionLeader.id).where(RegionLeader.name.in_(region_names))
+                )
+                region_ids = dict(result.all())
+            await session.execute(
+                leaders_info_statement(),
+                [
+                    {
+                        'b_leader_name': leader.group_leader_name,
+                        'b_region_leader_id': region_ids.get(leader.regional_leader_name),
+                        'b_telegram_login': leader.telegram_login
+                    }
+                    for leader in leaders
+                ]
+            )
 
 
-async def update_groups_leaders_info(group_leader_name: str, regional_leader_name: str, telegram_login: str) -> None:
+async def import_groups(groups_list: list[GroupModel]) -> ImportReport:
+    report = ImportReport()
+    groups_list = list(dict.fromkeys(groups_list))
+    leader_names = sorted({group.leader_name for group in groups_list})
+    if not leader_names:
+        return report
     async with async_session() as session:
         async with session.begin():
-            regional_leader: RegionLeader = (await session.execute(
-                select(RegionLeader).where(RegionLeader.name == regional_leader_name))) \
-                .scalar_one_or_none()
-            if regional_leader is None:
-                regional_leader = await session \
-                    .scalar(insert(RegionLeader).returning(RegionLeader), [{'name': regional_leader_name}])
-            group_leader: GroupLeader = (await session.execute(
-                select(GroupLeader).where(GroupLeader.name == group_leader_name))) \
-                .scalar_one_or_none()
-            if group_leader is not None:
-                group_leader.region_leader_id = regional_leader.id
-                group_leader.telegram_login = telegram_login
+            await session.execute(
+                postgresql.insert(GroupLeader.__table__).on_conflict_do_nothing(index_elements=['name']),
+                [{'name': name} for name in leader_names]
+            )
+            result: Result = await session.execute(
+                select(GroupLeader.name, GroupLeader.id).where(GroupLeader.name.in_(leader_names))
+            )
+            leader_ids: dict[str, int] = dict(result.all())
+            result = await session.execute(
+                postgresql.insert(Group.__table__)
+                .on_conflict_do_update(
+                    index_elements=['metro', 'day', 'time', 'age', 'type', 'leader_id'],
+                    set_={'is_open': True},
+                    where=Group.__table__.c.is_open.isnot(True)
+                )
+                .returning(literal_column('xmax = 0').label('inserted')),
+                [{
+                    'metro': group.metro,
+                    'day': group.day,
+                    'time': group.time,
+                    'age': group.age,
+                    'type': group.type,
+                    'is_open': True,
+                    'leader_id': leader_ids[group.leader_name]
+                } for group in groups_list]
+            )
+            for inserted, in result.all():
+                if inserted:
+                    report.inserted += 1
+                else:
+                    report.reopened += 1
+    logging.info('Импортировано групп: %s, новых: %s, открыто повторно: %s',
+                 len(groups_list), report.inserted, report.reopened)
+    return report
+
+
+async def get_hub_fingerprints() -> set[str]:
+    async with async_session() as session:
+        return set((await session.execute(select(HubFingerprint.fingerprint))).scalars())
 
 
-async def get_or_create_group(groups_list: list[GroupModel]) -> None:
+async def update_hub_fingerprints(added: list[str], removed: list[str]) -> None:
     async with async_session() as session:
         async with session.begin():
-            for new_group in groups_list:
-                result: Result = await session.execute(
-                    select(Group)
-                    .where(Group.metro == new_group.metro)
-                    .where(Group.day == new_group.day)
-                    .where(Group.time == new_group.time)
-                    .where(Group.age == new_group.age)
-                    .where(Group.type == new_group.type)
-                    .where(Group.leader_id == new_group.leader_id)
+            if removed:
+                await session.execute(delete(HubFingerprint).where(HubFingerprint.fingerprint.in_(removed)))
+            if added:
+                await session.execute(
+                    postgresql.insert(HubFingerprint.__table__).on_conflict_do_nothing(),
+                    [{'fingerprint': fingerprint} for fingerprint in added]
                 )
-                group: Group = result.scalar_one_or_none()
-                if group is None:
-                    await session.execute(insert(Group), [{
-                        'metro': new_group.metro,
-                        'day': new_group.day,
-                        'time': new_group.time,
-                        'age': new_group.age,
-                        'type': new_group.type,
-                        'is_open': True,
-                        'leader_id': new_group.leader_id
-                    }])
-                else:
-                    if group.is_open is False:
-                        group.is_open = True
 
 
 async def create_regional_leader(regional_leader_name: str, group_leader: GroupLeader) -> None:
@@ -114,40 +174,26 @@ async def create_regional_leader(regional_leader_name: str, group_leader: GroupL
                 group_leader.region_leader_id = regional_leader.id
 
 
-async def get_all_opened_groups(metro: str):
-    async with async_session() as session:
-        result = await session.execute(
-            select(Group)
-            .where(Group.is_open)
-            .filter(Group.metro.ilike(f'%{metro.lower()}%'))
-            .options(joinedload(Group.group_leader))
-        )
-        return result.scalars().fetchall()
-
-
-async def add_to_group(telegram_id: int, phone: str, group_leader_name: str, is_youth: bool) -> GroupLeader:
+async def add_to_group(telegram_id: int, phone: str, group_id: int, is_youth: bool, requester_name: str,
+                       contact: ContactModel, group_info_text: str) -> GroupLeader:
     async with async_session() as session:
         async with session.begin():
             result: Result = await session.execute(select(User).where(User.telegram_id == telegram_id))
             user: User = result.scalar_one()
-            logging.info(f'Получен пользователь: {user.first_name} {user.last_name}')
-            result: Result = await session.execute(
-                select(GroupLeader)
-                .where(GroupLeader.name == group_leader_name)
-                .options(joinedload(GroupLeader.region_leader))
-            )
-            group_leader: GroupLeader = result.scalar_one_or_none()
-            logging.info(f'Определен лидер ДГ: {group_leader.name}')
+            logging.debug('Получен пользователь: %s %s', user.first_name, user.last_name)
+            group: Group = (await session.execute(join_target_statement(group_id))).scalar_one()
+            group_leader: GroupLeader = group.group_leader
+            logging.debug('Определен лидер ДГ: %s', group_leader.name)
             region_leader: RegionLeader = group_leader.region_leader
             if region_leader is not None:
-                logging.info(f'Определен региональный лидер : {region_leader.name}')
+                logging.debug('Определен региональный лидер: %s', region_leader.name)
             await session.execute(
                 insert(JoinRequest), [{
                     'user_id': user.id,
                     'leader_id': group_leader.id
                 }]
             )
-            await add_join_request(JoinModel(
+            join_model = JoinModel(
                 date=datetime.now().strftime("%d.%m.%Y"),
                 first_name=user.first_name,
                 last_name=user.last_name,
@@ -158,17 +204,15 @@ async def add_to_group(telegram_id: int, phone: str, group_leader_name: str, is_
                 if region_leader is not None and region_leader.name is not None
                 else 'Имя не определено',
                 is_youth=is_youth
-            ))
+            )
+            await session.execute(
+                insert(SheetOutbox), [{
+                    'worksheet': worksheet_title(join_model.is_youth),
+                    'values': join_model.to_list()
+                }]
+            )
+            notifications = join_notifications(requester_name, contact, group_info_text, group_leader, is_youth)
+            if notifications:
+                await session.execute(insert(NotificationOutbox), notifications)
             return group_leader
 
-
-async def add_join_request(data: JoinModel):
-    client = gspread.authorize(credentials)
-    spreadsheet = client.open("Заявки на домашние группы")
-    worksheet = spreadsheet.worksheet('Молодежные заявки' if data.is_youth else 'Общие заявки')
-    values = worksheet.get_all_values()
-    cell_values = data.to_list()
-    first_empty_row = len(values) + 1
-    for index, value in enumerate(cell_values):
-        worksheet.update_cell(first_empty_row, index + 1, value)
-    logging.info('Добавлено новое значение в таблицу заявок в ДГ')
@@ -0,0 +1,192 @@
+import hashlib
+import html
+import json
+import logging
+import math
+import os
+import traceback
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime
+
+from telegram import Update
+from telegram.constants import ParseMode, MessageLimit
+from telegram.error import TelegramError
+from telegram.ext import ContextTypes, Application
+
+from services.rate_limiter import NOTIFICATION_PRIORITY
+
+ERROR_DIGEST_JOB_NAME = 'error_digest'
+ERROR_DIGEST_INTERVAL = int(os.getenv('ERROR_DIGEST_INTERVAL', '300'))
+ERROR_BUFFER_SIZE = int(os.getenv('ERROR_BUFFER_SIZE', '200'))
+TRACEBACK_PREVIEW_SIZE = 3000
+SUMMARY_PREVIEW_SIZE = 500
+REPORT_PART_SIZE = 3500
+MAX_ESCAPE_LENGTH = len('&quot;')
+
+
+@dataclass(frozen=True)
+class ErrorReport:
+    fingerprint: str
+    occurred_at: datetime
+    summary: str
+    traceback: str
+    update: str
+    chat_data: str
+    user_data: str
+
+
+@dataclass
+class ErrorDigest:
+    summary: str
+    first_seen: datetime
+    last_seen: datetime
+    total: int = 0
+    unreported: int = 0
+    reported: bool = False
+
+
+_reports: deque[ErrorReport] = deque(maxlen=ERROR_BUFFER_SIZE)
+_digests: dict[str, ErrorDigest] = {}
+
+
+def error_fingerprint(error: BaseException) -> str:
+    frames = traceback.extract_tb(error.__traceback__)
+    signature = [type(error).__module__, type(error).__qualname__]
+    signature += [f'{os.path.basename(frame.filename)}:{frame.name}' for frame in frames]
+    return hashlib.sha1('|'.join(signature).encode()).hexdigest()[:12]
+
+
+def record_error(update: object, context: ContextTypes.DEFAULT_TYPE) -> tuple[ErrorReport, ErrorDigest]:
+    error = context.error
+    now = datetime.now()
+    fingerprint = error_fingerprint(error)
+    summary = f'{type(error).__name__}: {error}'
+    report = ErrorReport(
+        fingerprint=fingerprint,
+        occurred_at=now,
+        summary=summary,
+        traceback=''.join(traceback.format_exception(None, error, error.__traceback__)),
+        update=json.dumps(update.to_dict() if isinstance(update, Update) else str(update), indent=2,
+                          ensure_ascii=False),
+        chat_data=str(context.chat_data),
+        user_data=str(context.user_data)
+    )
+    _reports.append(report)
+    digest = _digests.setdefault(fingerprint, ErrorDigest(summary=summary, first_seen=now, last_seen=now))
+    digest.last_seen = now
+    digest.total += 1
+    digest.unreported += 1
+    return report, digest
+
+
+def find_report(fingerprint: str) -> ErrorReport | None:
+    for report in reversed(_reports):
+        if report.fingerprint.startswith(fingerprint):
+            return report
+    return None
+
+
+def recent_errors_text() -> str:
+    if not _digests:
+        return 'Ошибок за последнее время нет'
+    lines = [
+        f'{fingerprint}: {digest.total} раз, последний {digest.last_seen:%d.%m %H:%M:%S}\n{digest.summary[:200]}'
+        for fingerprint, digest in sorted(_digests.items(), key=lambda item: item[1].last_seen, reverse=True)
+    ]
+    return '\n\n'.join(lines)[:REPORT_PART_SIZE]
+
+
+def escape_prefix(text: str, limit: int) -> tuple[str, int]:
+    end = min(len(text), limit)
+    escaped = html.escape(text[:end])
+    while len(escaped) > limit:
+        end -= math.ceil((len(escaped) - limit) / MAX_ESCAPE_LENGTH)
+        escaped = html.escape(text[:end])
+    return escaped, end
+
+
+def escape_suffix(text: str, limit: int) -> str:
+    start = max(0, len(text) - limit)
+    escaped = html.escape(text[start:])
+    while len(escaped) > limit:
+        start += math.ceil((len(escaped) - limit) / MAX_ESCAPE_LENGTH)
+        escaped = html.escape(text[start:])
+    return escaped
+
+
+def first_occurrence_message(report: ErrorReport) -> str:
+    text = (
+        f'<pre>Новая ошибка {report.fingerprint}</pre>\n'
+        f'<pre>{escape_prefix(report.summary, SUMMARY_PREVIEW_SIZE)[0]}</pre>\n\n'
+        f'<pre>{escape_suffix(report.traceback, TRACEBACK_PREVIEW_SIZE)}</pre>\n\n'
+        f'Повторы будут приходить сводкой, подробности: /errors {report.fingerprint}'
+    )
+    return text[:MessageLimit.MAX_TEXT_LENGTH]
+
+
+def digest_message(fingerprint: str, digest: ErrorDigest) -> str:
+    return (
+        f'<pre>Ошибка {fingerprint} повторилась {digest.unreported} раз, всего {digest.total}</pre>\n'
+        f'<pre>{escape_prefix(digest.summary, SUMMARY_PREVIEW_SIZE)[0]}</pre>\n'
+        f'Последний раз: {digest.last_seen:%d.%m %H:%M:%S}, подробности: /errors {fingerprint}'
+    )
+
+
+def report_parts(report: ErrorReport) -> list[str]:
+    text = (
+        f'Ошибка {report.fingerprint}, {report.occurred_at:%d.%m %H:%M:%S}\n{report.summary}\n\n'
+        f'update = {report.update}\n\n'
+        f'context.chat_data = {report.chat_data}\n\n'
+        f'context.user_data = {report.user_data}\n\n'
+        f'{report.traceback}'
+    )
+    parts = []
+    while text:
+        escaped, end = escape_prefix(text, REPORT_PART_SIZE)
+        parts.append(f'<pre>{escaped}</pre>')
+        text = text[end:]
+    return parts
+
+
+async def send_admin_message(context: ContextTypes.DEFAULT_TYPE, text: str) -> None:
+    await context.bot.send_message(
+        chat_id=os.getenv('ADMIN_ID'),
+        text=text,
+        parse_mode=ParseMode.HTML,
+        rate_limit_args=NOTIFICATION_PRIORITY
+    )
+
+
+async def report_error(update: object, context: ContextTypes.DEFAULT_TYPE) -> None:
+    report, digest = record_error(update, context)
+    if digest.reported:
+        return
+    digest.reported = True
+    try:
+        await send_admin_message(context, first_occurrence_message(report))
+    except TelegramError as error:
+        digest.reported = False
+        logging.warning('Не удалось отправить ошибку %s администратору: %s', report.fingerprint, error)
+        return
+    digest.unreported = 0
+
+
+async def error_digest_job(context: ContextTypes.DEFAULT_TYPE) -> None:
+    for fingerprint, digest in list(_digests.items()):
+        if not digest.unreported:
+            if (datetime.now() - digest.last_seen).total_seconds() > ERROR_DIGEST_INTERVAL:
+                del _digests[fingerprint]
+            continue
+        try:
+            await send_admin_message(context, digest_message(fingerprint, digest))
+        except TelegramError as error:
+            logging.warning('Не удалось отправить сводку ошибки %s: %s', fingerprint, error)
+            continue
+        digest.unreported = 0
+
+
+def schedule_error_digest(application: Application) -> None:
+    application.job_queue.run_repeating(
+        error_digest_job, interval=ERROR_DIGEST_INTERVAL, first=ERROR_DIGEST_INTERVAL, name=ERROR_DIGEST_JOB_NAME
+    )
@@ -0,0 +1,110 @@
+import asyncio
+import logging
+import os
+
+from telegram import Message
+from telegram.error import TelegramError
+from telegram.ext import ContextTypes, Application
+
+from database.connection import advisory_lock
+from database.models import ImportReport
+from services.import_service import import_data, sync_data, HUB_STAGE, GENERAL_SHEET_STAGE, YOUTH_SHEET_STAGE, \
+    RECONCILIATION_STAGE, CATALOG_STAGE
+
+IMPORT_JOB_NAME = 'import'
+SYNC_JOB_NAME = 'hub_sync'
+SYNC_INTERVAL = int(os.getenv('HUB_SYNC_INTERVAL', '600'))
+IMPORT_LOCK_KEY = 7301
+IMPORT_STAGES = {
+    HUB_STAGE: 'Группы из хаба',
+    GENERAL_SHEET_STAGE: 'Общая таблица лидеров',
+    YOUTH_SHEET_STAGE: 'Молодежная таблица лидеров',
+    RECONCILIATION_STAGE: 'Сверка открытых групп',
+    CATALOG_STAGE: 'Обновление каталога'
+}
+
+import_lock = asyncio.Lock()
+_status_messages: list[Message] = []
+_stage_timings: dict[str, float] = {}
+_current_stage: str | None = None
+_import_running = False
+
+
+def import_status_text(report: ImportReport | None = None, failed: bool = False) -> str:
+    lines = ['Импорт данных']
+    for stage, title in IMPORT_STAGES.items():
+        if stage in _stage_timings and not (failed and stage == _current_stage):
+            lines.append(f'{title}: готово за {_stage_timings[stage]:.1f} с')
+        elif stage == _current_stage:
+            lines.append(f'{title}: {"ошибка" if failed else "выполняется"}')
+        else:
+            lines.append(f'{title}: ожидает')
+    if report is not None:
+        lines.append(
+            f'\nИмпорт успешно завершен\n'
+            f'Добавлено групп: {report.inserted}\n'
+            f'Открыто повторно: {report.reopened}\n'
+            f'Закрыто: {report.closed}'
+        )
+    elif failed:
+        lines.append('\nИмпорт завершился с ошибкой')
+    return '\n'.join(lines)
+
+
+async def update_import_status(text: str) -> None:
+    for message in _status_messages:
+        try:
+            await message.edit_text(text=text)
+        except TelegramError as error:
+            logging.warning('Не удалось обновить статус импорта: %s', error)
+
+
+async def start_import(context: ContextTypes.DEFAULT_TYPE, chat_id: int) -> None:
+    global _import_running
+    _status_messages.append(await context.bot.send_message(chat_id=chat_id, text=import_status_text()))
+    if _import_running:
+        logging.info('Импорт уже выполняется, подписываемся на статус')
+        return
+    _import_running = True
+    context.job_queue.run_once(import_job, when=0, name=IMPORT_JOB_NAME)
+    logging.info('Импорт запущен в фоне')
+
+
+async def on_import_stage(stage: str) -> None:
+    global _current_stage
+    _current_stage = stage
+    await update_import_status(import_status_text())
+
+
+async def import_job(context: ContextTypes.DEFAULT_TYPE) -> None:
+    global _current_stage, _import_running
+    _stage_timings.clear()
+    _current_stage = None
+    try:
+        async with import_lock, advisory_lock(IMPORT_LOCK_KEY):
+            report: ImportReport = await import_data(on_import_stage, _stage_timings)
+        _current_stage = None
+        await update_import_status(import_status_text(report))
+    except Exception:
+        await update_import_status(import_status_text(failed=True))
+        raise
+    finally:
+        _status_messages.clear()
+        _import_running = False
+
+
+async def sync_job(context: ContextTypes.DEFAULT_TYPE) -> None:
+    if _import_running or import_lock.locked():
+        logging.info('Импорт уже выполняется, пропускаем синхронизацию с хабом')
+        return
+    async with import_lock, advisory_lock(IMPORT_LOCK_KEY, wait=False) as acquired:
+        if not acquired:
+            logging.info('Импорт выполняется другим воркером, пропускаем синхронизацию с хабом')
+            return
+        await sync_data()
+
+
+def schedule_sync(application: Application) -> None:
+    if SYNC_INTERVAL > 0:
+        application.job_queue.run_repeating(sync_job, interval=SYNC_INTERVAL, first=SYNC_INTERVAL, name=SYNC_JOB_NAME)
+        logging.info('Синхронизация с хабом запланирована каждые %s с', SYNC_INTERVAL)
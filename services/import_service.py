@@ -1,91 +1,213 @@
-import io
+import hashlib
+import logging
 import os
+import time
+from contextlib import asynccontextmanager
+from typing import Callable, Awaitable
 
-import aiohttp
-import pandas
-from numpy import ndarray
-from sqlalchemy import select
-from sqlalchemy.orm import joinedload
+from sqlalchemy import select, update, Select
 
-from database.connection import get_wolrus_connection, async_session
-from database.entities import GroupLeader, Group
-from database.models import GroupModel
-from services.data_service import get_or_create_group_leader, get_or_create_group, update_groups_leaders_info
+from database.connection import async_session
+from database.entities import Group, GroupLeader
+from database.models import GroupModel, ImportReport, ReconciliationDiff, SheetColumnsModel, LeaderInfoModel
+from services.adapters import get_hub_source, get_sheet_source, csv_rows
+from services.catalog import load_catalog, notify_catalog_changed
+from services.data_service import import_groups, update_groups_leaders_info, get_hub_fingerprints, \
+    update_hub_fingerprints, reset_backfilled_logins
+from services.metrics import IMPORT_STAGE_DURATION
 
 SHEET_ID = os.getenv('WOL_HOME_GROUP_SHEET_ID')
 YOUTH_TABLE_ID = os.getenv('WOL_HOME_GROUP_YOUTH_ID')
 GENERAL_TABLE_ID = os.getenv('WOL_HOME_GROUP_GENERAL_ID')
-URL = 'https://docs.google.com/spreadsheets/d/{}/export?format=csv&gid={}'
+GENERAL_SHEET_COLUMNS_VARIABLE = 'WOL_HOME_GROUP_GENERAL_COLUMNS'
+YOUTH_SHEET_COLUMNS_VARIABLE = 'WOL_HOME_GROUP_YOUTH_COLUMNS'
+GENERAL_SHEET_COLUMNS = os.getenv(GENERAL_SHEET_COLUMNS_VARIABLE, 'region=0,leader=2,telegram=4')
+YOUTH_SHEET_COLUMNS = os.getenv(YOUTH_SHEET_COLUMNS_VARIABLE, 'region=0,leader=1,telegram=6')
+SHEET_COLUMN_KEYS = ('region', 'leader', 'telegram')
+LEADER_BATCH_SIZE = 500
 
 
-async def import_data():
-    await parse_data_from_hub()
-    await parse_data_from_google(GENERAL_TABLE_ID)
-    await parse_data_from_google(YOUTH_TABLE_ID)
-    await check_open_groups()
+StageCallback = Callable[[str], Awaitable[None]]
 
+HUB_STAGE = 'hub'
+GENERAL_SHEET_STAGE = 'general'
+YOUTH_SHEET_STAGE = 'youth'
+RECONCILIATION_STAGE = 'reconciliation'
+CATALOG_STAGE = 'catalog'
 
-async def parse_data_from_hub():
-    connection = await get_wolrus_connection()
+
+@asynccontextmanager
+async def import_stage(stage: str, stage_timings: dict[str, float], on_stage: StageCallback | None):
+    if on_stage is not None:
+        await on_stage(stage)
+    started = time.perf_counter()
     try:
-        results = await connection.fetch(
-            'SELECT subway, weekday, time_of_hg, type_age, type_of_hg, name_leader '
-            'FROM master_data_history_view '
-            'WHERE enable_for_site = true'
-        )
-        group_list: list[GroupModel] = list()
-        for result in results:
-            group_leader: GroupLeader = await get_or_create_group_leader(name=result.get('name_leader'))
-            group_list.append(
-                GroupModel(
-                    metro=result.get('subway'),
-                    day=result.get('weekday'),
-                    time=result.get('time_of_hg'),
-                    age=result.get('type_age'),
-                    type=result.get('type_of_hg'),
-                    leader_id=group_leader.id
-                )
-            )
-        await get_or_create_group(group_list)
+        yield
     finally:
-        await connection.close()
-
-
-async def parse_data_from_google(table_id):
-    url: str = URL.format(SHEET_ID, table_id)
-    async with aiohttp.ClientSession() as session:
-        async with session.get(url) as response:
-            data: str = await response.text()
-            data_from_google: ndarray = pandas.read_csv(io.StringIO(data)).values
-            leader_name_cell: int = 2 if table_id == GENERAL_TABLE_ID else 1
-            leader_tg_cell: int = 4 if table_id == GENERAL_TABLE_ID else 6
-            for row in data_from_google:
-                await update_groups_leaders_info(
-                    group_leader_name=row[leader_name_cell].strip(),
-                    regional_leader_name=row[0],
-                    telegram_login=str(row[leader_tg_cell]).replace('@', '')
-                )
+        stage_timings[stage] = time.perf_counter() - started
+        IMPORT_STAGE_DURATION.labels(stage).observe(stage_timings[stage])
+        logging.info('Этап импорта %s занял %.2f с', stage, stage_timings[stage])
+
+
+async def import_data(on_stage: StageCallback | None = None,
+                      stage_timings: dict[str, float] | None = None) -> ImportReport:
+    stage_timings = {} if stage_timings is None else stage_timings
+    async with import_stage(HUB_STAGE, stage_timings, on_stage):
+        hub_groups: list[GroupModel] = await parse_data_from_hub()
+        report: ImportReport = await import_groups(hub_groups)
+    async with import_stage(GENERAL_SHEET_STAGE, stage_timings, on_stage):
+        await parse_data_from_google(GENERAL_SHEET)
+    async with import_stage(YOUTH_SHEET_STAGE, stage_timings, on_stage):
+        await parse_data_from_google(YOUTH_SHEET)
+        reset_backfilled_logins()
+    async with import_stage(RECONCILIATION_STAGE, stage_timings, on_stage):
+        diff: ReconciliationDiff = await check_open_groups(hub_groups)
+        report.closed = len(diff.to_close)
+        await store_hub_fingerprints(hub_groups)
+    async with import_stage(CATALOG_STAGE, stage_timings, on_stage):
+        await load_catalog()
+        await notify_catalog_changed()
+    report.stage_timings = stage_timings
+    return report
+
+
+async def sync_data() -> ImportReport | None:
+    hub_groups: list[GroupModel] = await parse_data_from_hub()
+    fingerprints: dict[str, GroupModel] = {group_fingerprint(group): group for group in hub_groups}
+    stored_fingerprints: set[str] = await get_hub_fingerprints()
+    added = [fingerprint for fingerprint in fingerprints if fingerprint not in stored_fingerprints]
+    removed = [fingerprint for fingerprint in stored_fingerprints if fingerprint not in fingerprints]
+    if not added and not removed:
+        logging.info('Синхронизация с хабом: изменений нет')
+        return None
+    report: ImportReport = await import_groups([fingerprints[fingerprint] for fingerprint in added])
+    if removed:
+        report.closed = len((await check_open_groups(hub_groups)).to_close)
+    await update_hub_fingerprints(added, removed)
+    await load_catalog()
+    await notify_catalog_changed()
+    logging.info('Синхронизация с хабом: добавлено %s, удалено %s', len(added), len(removed))
+    return report
+
+
+async def store_hub_fingerprints(hub_groups: list[GroupModel]) -> None:
+    fingerprints: set[str] = {group_fingerprint(group) for group in hub_groups}
+    stored_fingerprints: set[str] = await get_hub_fingerprints()
+    await update_hub_fingerprints(list(fingerprints - stored_fingerprints), list(stored_fingerprints - fingerprints))
+
+
+def group_fingerprint(group: GroupModel) -> str:
+    return hashlib.sha256(
+        '\x1f'.join(str(value) for value in (
+            group.leader_name, group.day, group.time, group.metro, group.age, group.type
+        )).encode()
+    ).hexdigest()
+
+
+async def preview_import() -> ReconciliationDiff:
+    return await check_open_groups(await parse_data_from_hub(), dry_run=True)
+
 
+async def parse_data_from_hub() -> list[GroupModel]:
+    return await get_hub_source().fetch_groups()
 
-async def check_open_groups():
+
+def sheet_columns(table_id: str, columns: str, variable: str) -> SheetColumnsModel:
+    mapping: dict[str, str] = {}
+    for item in columns.split(','):
+        if not item.strip():
+            continue
+        key, separator, value = item.partition('=')
+        if not separator or not value.strip():
+            raise ValueError(f'{variable}: ожидается формат ключ=колонка, получено {item.strip()!r}')
+        mapping[key.strip()] = value.strip()
+    missing = [key for key in SHEET_COLUMN_KEYS if key not in mapping]
+    if missing:
+        raise ValueError(f'{variable}: не указаны колонки {", ".join(missing)}')
+    return SheetColumnsModel(
+        table_id=table_id,
+        region=mapping['region'],
+        leader=mapping['leader'],
+        telegram=mapping['telegram']
+    )
+
+
+GENERAL_SHEET = sheet_columns(GENERAL_TABLE_ID, GENERAL_SHEET_COLUMNS, GENERAL_SHEET_COLUMNS_VARIABLE)
+YOUTH_SHEET = sheet_columns(YOUTH_TABLE_ID, YOUTH_SHEET_COLUMNS, YOUTH_SHEET_COLUMNS_VARIABLE)
+
+
+def column_index(header: list[str], column: str) -> int:
+    if column.isdigit():
+        return int(column)
+    stripped_header = [name.strip() for name in header]
+    if column not in stripped_header:
+        raise ValueError(f'В таблице нет колонки {column}, есть: {", ".join(stripped_header)}')
+    return stripped_header.index(column)
+
+
+def cell(row: list[str], index: int) -> str:
+    return row[index].strip() if index < len(row) else ''
+
+
+async def parse_data_from_google(sheet: SheetColumnsModel) -> int:
+    rows = csv_rows(get_sheet_source().lines(SHEET_ID, sheet.table_id))
+    header = await anext(rows, None)
+    if header is None:
+        return 0
+    region_index, leader_index, telegram_index = (
+        column_index(header, column) for column in (sheet.region, sheet.leader, sheet.telegram)
+    )
+    imported = 0
+    batch: list[LeaderInfoModel] = []
+    async for row in rows:
+        leader_name = cell(row, leader_index)
+        if not leader_name:
+            continue
+        batch.append(LeaderInfoModel(
+            group_leader_name=leader_name,
+            regional_leader_name=cell(row, region_index),
+            telegram_login=cell(row, telegram_index).replace('@', '') or None
+        ))
+        if len(batch) >= LEADER_BATCH_SIZE:
+            await update_groups_leaders_info(batch)
+            imported += len(batch)
+            batch = []
+    if batch:
+        await update_groups_leaders_info(batch)
+        imported += len(batch)
+    logging.info('Обновлено лидеров из таблицы %s: %s', sheet.table_id, imported)
+    return imported
+
+
+def opened_groups_statement() -> Select:
+    return select(Group.id, Group.metro, Group.day, Group.time, Group.age, Group.type, GroupLeader.name) \
+        .outerjoin(GroupLeader, Group.leader_id == GroupLeader.id) \
+        .where(Group.is_open)
+
+
+async def check_open_groups(hub_groups: list[GroupModel], dry_run: bool = False) -> ReconciliationDiff:
+    enabled_groups: set[GroupModel] = set(hub_groups)
     async with async_session() as session:
         async with session.begin():
-            result = await session.execute(select(Group).options(joinedload(Group.group_leader)))
-            groups = result.scalars().all()
-            connection = await get_wolrus_connection()
-            try:
-                for group in groups:
-                    group_status = await connection.fetchval(
-                        f'SELECT enable_for_site '
-                        f'FROM master_data_history_view '
-                        f'WHERE name_leader = \'{group.group_leader.name}\' '
-                        f'AND weekday = \'{group.day}\' '
-                        f'AND time_of_hg = \'{group.time}\' '
-                        f'AND subway = \'{group.metro}\' '
-                        f'AND type_age = \'{group.age}\' '
-                        f'AND type_of_hg = \'{group.type}\''
-                    )
-                    if group_status is None or group_status is False:
-                        group.is_open = False
-            finally:
-                await connection.close()
+            result = await session.execute(opened_groups_statement())
+            opened_groups: dict[GroupModel, int] = {
+                GroupModel(metro, day, group_time, age, group_type, leader_name): group_id
+                for group_id, metro, day, group_time, age, group_type, leader_name in result.all()
+            }
+            diff = ReconciliationDiff(
+                to_open=[group for group in enabled_groups if group not in opened_groups],
+                to_close=[group for group in opened_groups if group not in enabled_groups]
+            )
+            if dry_run:
+                for group in diff.to_open:
+                    logging.info('Будет открыта группа: %s', group)
+                for group in diff.to_close:
+                    logging.info('Будет закрыта группа: %s', group)
+            elif diff.to_close:
+                await session.execute(
+                    update(Group)
+                    .where(Group.id.in_([opened_groups[group] for group in diff.to_close]))
+                    .values(is_open=False)
+                )
+    logging.info('Сверка с хабом: к открытию %s, к закрытию %s', len(diff.to_open), len(diff.to_close))
+    return diff
@@ -5,6 +5,8 @@ PICK_GROUP_TEXT = 'Подобрать группу'
 JOIN_TO_GROUP_TEXT = 'Присоединиться'
 SEND_CONTACT_TEXT = 'Отправить контакт'
 OPEN_NEW_GROUP_TEXT = 'Открыть свою группу'
+PREVIOUS_PAGE_TEXT = '« Назад'
+NEXT_PAGE_TEXT = 'Далее »'
 WRITE_METRO_TEXT = 'Написать название метро'
 
 start_keyboard = ReplyKeyboardMarkup([
@@ -12,10 +14,6 @@ start_keyboard = ReplyKeyboardMarkup([
     [KeyboardButton(text=WRITE_METRO_TEXT)]
 ], resize_keyboard=True, one_time_keyboard=True)
 
-join_to_group_keyboard = InlineKeyboardMarkup([
-    [InlineKeyboardButton(JOIN_TO_GROUP_TEXT, callback_data='join_to_group')]
-])
-
 another_search_keyboard = ReplyKeyboardMarkup([
     [KeyboardButton(text=WRITE_METRO_TEXT)],
     [KeyboardButton(text=PICK_GROUP_TEXT), KeyboardButton(text=RETURN_BUTTON_TEXT)]
@@ -60,3 +58,29 @@ conversation_type_keyboard = ReplyKeyboardMarkup([
 conversation_result_keyboard = ReplyKeyboardMarkup([
     [KeyboardButton(text='Посмотреть результат')]], resize_keyboard=True
 )
+
+
+def metro_suggestions_keyboard(suggestions: list[tuple[str, str]]) -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup(
+        [[InlineKeyboardButton(station, callback_data=f'metro:{key}')] for key, station in suggestions] +
+        [[InlineKeyboardButton(RETURN_BUTTON_TEXT, callback_data='return_to_start')]]
+    )
+
+
+def join_to_group_button(text: str, group_id: int) -> InlineKeyboardButton:
+    return InlineKeyboardButton(text, callback_data=f'join:{group_id}')
+
+
+def search_results_keyboard(groups: list[tuple[int, int]], page: int, pages_count: int) -> InlineKeyboardMarkup:
+    buttons = [
+        [join_to_group_button(f'{JOIN_TO_GROUP_TEXT} к группе {number}', group_id)]
+        for number, group_id in groups
+    ]
+    navigation = []
+    if page > 0:
+        navigation.append(InlineKeyboardButton(PREVIOUS_PAGE_TEXT, callback_data=f'page:{page - 1}'))
+    if page < pages_count - 1:
+        navigation.append(InlineKeyboardButton(NEXT_PAGE_TEXT, callback_data=f'page:{page + 1}'))
+    if navigation:
+        buttons.append(navigation)
+    return InlineKeyboardMarkup(buttons)
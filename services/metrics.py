@@ -0,0 +1,113 @@
+import contextvars
+import functools
+import logging
+import os
+import time
+from typing import Any, Callable, Coroutine
+
+from prometheus_client import Counter, Gauge, Histogram, start_http_server
+from sqlalchemy import event
+from telegram.ext import Application, BaseHandler, ConversationHandler
+
+from database.connection import engine
+
+METRICS_PORT = os.getenv('METRICS_PORT')
+METRICS_LISTEN = os.getenv('METRICS_LISTEN', '127.0.0.1')
+BACKGROUND_HANDLER = 'background'
+
+HANDLER_DURATION = Histogram('bot_handler_duration_seconds', 'Время работы обработчика', ['handler'])
+HANDLER_ERRORS = Counter('bot_handler_errors_total', 'Ошибки в обработчиках', ['handler'])
+DB_QUERY_DURATION = Histogram('bot_db_query_duration_seconds', 'Время SQL-запросов по обработчикам', ['handler'])
+TELEGRAM_REQUEST_DURATION = Histogram('bot_telegram_request_duration_seconds', 'Время запросов к Bot API',
+                                      ['endpoint'])
+TELEGRAM_REQUESTS = Counter('bot_telegram_requests_total', 'Запросы к Bot API', ['endpoint', 'result'])
+IMPORT_STAGE_DURATION = Histogram('bot_import_stage_duration_seconds', 'Время этапов импорта', ['stage'],
+                                  buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300))
+CATALOG_PAGES_CACHE = Counter('bot_catalog_pages_cache_total', 'Обращения к кэшу страниц результатов', ['result'])
+UPDATE_QUEUE_DEPTH = Gauge('bot_update_queue_depth', 'Обновления, ожидающие обработки')
+
+CallbackWrapper = Callable[[Callable[..., Coroutine[Any, Any, Any]]], Callable[..., Coroutine[Any, Any, Any]]]
+
+current_handler: contextvars.ContextVar[str] = contextvars.ContextVar('current_handler', default=BACKGROUND_HANDLER)
+
+
+def instrument_callback(callback: Callable[..., Coroutine[Any, Any, Any]]) -> Callable[..., Coroutine[Any, Any, Any]]:
+    name = callback.__name__
+
+    @functools.wraps(callback)
+    async def instrumented(update: object, context: Any) -> Any:
+        token = current_handler.set(name)
+        started = time.perf_counter()
+        try:
+            return await callback(update, context)
+        except Exception:
+            HANDLER_ERRORS.labels(name).inc()
+            raise
+        finally:
+            HANDLER_DURATION.labels(name).observe(time.perf_counter() - started)
+            current_handler.reset(token)
+
+    return instrumented
+
+
+def instrument_handler(handler: BaseHandler, wrapper: CallbackWrapper = instrument_callback) -> None:
+    if isinstance(handler, ConversationHandler):
+        nested = handler.entry_points + handler.fallbacks
+        for state_handlers in handler.states.values():
+            nested += state_handlers
+        for nested_handler in nested:
+            instrument_handler(nested_handler, wrapper)
+        return
+    instrumented_by = getattr(handler.callback, 'instrumented_by', ())
+    if wrapper not in instrumented_by:
+        handler.callback = wrapper(handler.callback)
+        handler.callback.instrumented_by = instrumented_by + (wrapper,)
+
+
+def instrument_application(application: Application) -> None:
+    for handlers in application.handlers.values():
+        for handler in handlers:
+            instrument_handler(handler)
+    if hasattr(application, 'queue_depth'):
+        UPDATE_QUEUE_DEPTH.set_function(lambda: application.queue_depth)
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    started = conn.info['query_started'].pop()
+    DB_QUERY_DURATION.labels(current_handler.get()).observe(time.perf_counter() - started)
+
+
+def handle_query_error(context) -> None:
+    if context.connection is not None and context.connection.info.get('query_started'):
+        context.connection.info['query_started'].pop()
+
+
+def instrument_database() -> None:
+    event.listen(engine.sync_engine, 'before_cursor_execute', before_cursor_execute)
+    event.listen(engine.sync_engine, 'after_cursor_execute', after_cursor_execute)
+    event.listen(engine.sync_engine, 'handle_error', handle_query_error)
+
+
+async def observe_telegram_request(endpoint: str, callback: Callable[..., Coroutine[Any, Any, Any]], args: Any,
+                                   kwargs: dict[str, Any]) -> Any:
+    started = time.perf_counter()
+    try:
+        result = await callback(*args, **kwargs)
+    except Exception as error:
+        TELEGRAM_REQUESTS.labels(endpoint, type(error).__name__).inc()
+        raise
+    finally:
+        TELEGRAM_REQUEST_DURATION.labels(endpoint).observe(time.perf_counter() - started)
+    TELEGRAM_REQUESTS.labels(endpoint, 'ok').inc()
+    return result
+
+
+def start_metrics_server() -> None:
+    if not METRICS_PORT:
+        return
+    start_http_server(int(METRICS_PORT), addr=METRICS_LISTEN)
+    logging.info('Метрики доступны на %s:%s/metrics', METRICS_LISTEN, METRICS_PORT)
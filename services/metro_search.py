@@ -0,0 +1,117 @@
+import hashlib
+import re
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Iterable
+
+SEARCH_TIME_BUDGET = 0.005
+SUGGESTIONS_LIMIT = 5
+SIMILARITY_THRESHOLD = 0.3
+STATION_KEY_SIZE = 6
+
+STATION_PREFIX_PATTERN = re.compile(r'^(м\.|м |метро |станция |ст\. ?)+')
+NON_WORD_PATTERN = re.compile(r'[^0-9a-zа-я ]+')
+SPACES_PATTERN = re.compile(r'\s+')
+LATIN_PATTERN = re.compile(r'[a-z]')
+CYRILLIC_SIMPLIFICATION = str.maketrans({'ё': 'е', 'ь': None, 'ъ': None})
+LATIN_VOWELS = 'aeiou'
+
+TRANSLITERATION = (
+    ('shch', 'щ'), ('sch', 'щ'), ('zh', 'ж'), ('kh', 'х'), ('ts', 'ц'), ('ch', 'ч'), ('sh', 'ш'),
+    ('yu', 'ю'), ('ya', 'я'), ('yo', 'е'), ('a', 'а'), ('b', 'б'), ('c', 'к'), ('d', 'д'), ('e', 'е'),
+    ('f', 'ф'), ('g', 'г'), ('h', 'х'), ('i', 'и'), ('j', 'й'), ('k', 'к'), ('l', 'л'), ('m', 'м'),
+    ('n', 'н'), ('o', 'о'), ('p', 'п'), ('q', 'к'), ('r', 'р'), ('s', 'с'), ('t', 'т'), ('u', 'у'),
+    ('v', 'в'), ('w', 'в'), ('x', 'кс'), ('y', 'ы'), ('z', 'з')
+)
+
+
+@dataclass(frozen=True)
+class StationIndex:
+    stations: tuple[str, ...] = ()
+    normalized: tuple[str, ...] = ()
+    trigrams: dict[str, tuple[int, ...]] = field(default_factory=dict)
+    trigram_counts: tuple[int, ...] = ()
+    by_key: dict[str, str] = field(default_factory=dict)
+
+
+def station_key(station: str) -> str:
+    return hashlib.blake2s(station.encode(), digest_size=STATION_KEY_SIZE).hexdigest()
+
+
+def transliterate(value: str) -> str:
+    result = []
+    position = 0
+    while position < len(value):
+        for latin, cyrillic in TRANSLITERATION:
+            if value.startswith(latin, position):
+                if latin == 'y' and position and value[position - 1] in LATIN_VOWELS:
+                    cyrillic = 'й'
+                result.append(cyrillic)
+                position += len(latin)
+                break
+        else:
+            result.append(value[position])
+            position += 1
+    return ''.join(result)
+
+
+def normalize_station(value: str) -> str:
+    value = value.lower().strip()
+    if LATIN_PATTERN.search(value):
+        value = transliterate(value)
+    value = value.translate(CYRILLIC_SIMPLIFICATION)
+    value = NON_WORD_PATTERN.sub(' ', STATION_PREFIX_PATTERN.sub('', value))
+    return SPACES_PATTERN.sub(' ', value).strip()
+
+
+def station_trigrams(normalized: str) -> set[str]:
+    padded = f'  {normalized} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def build_station_index(stations: Iterable[str]) -> StationIndex:
+    stations = tuple(sorted(set(stations)))
+    normalized = tuple(normalize_station(station) for station in stations)
+    postings: dict[str, list[int]] = {}
+    trigram_counts = []
+    for index, value in enumerate(normalized):
+        grams = station_trigrams(value)
+        trigram_counts.append(len(grams))
+        for gram in grams:
+            postings.setdefault(gram, []).append(index)
+    return StationIndex(
+        stations=stations,
+        normalized=normalized,
+        trigrams={gram: tuple(indexes) for gram, indexes in postings.items()},
+        trigram_counts=tuple(trigram_counts),
+        by_key={station_key(station): station for station in stations}
+    )
+
+
+def match_stations(index: StationIndex, query: str) -> list[str]:
+    query = normalize_station(query)
+    if not query:
+        return []
+    return [index.stations[i] for i, value in enumerate(index.normalized) if query in value]
+
+
+def suggest_stations(index: StationIndex, query: str, limit: int = SUGGESTIONS_LIMIT,
+                     time_budget: float = SEARCH_TIME_BUDGET) -> list[tuple[int, str]]:
+    query = normalize_station(query)
+    if not query:
+        return []
+    deadline = time.perf_counter() + time_budget
+    grams = station_trigrams(query)
+    shared = Counter()
+    for gram in grams:
+        shared.update(index.trigrams.get(gram, ()))
+        if time.perf_counter() > deadline:
+            break
+    scored = []
+    for station_index, count in shared.items():
+        similarity = count / (len(grams) + index.trigram_counts[station_index] - count)
+        if similarity >= SIMILARITY_THRESHOLD:
+            scored.append((similarity, station_index))
+    scored.sort(key=lambda item: (-item[0], index.stations[item[1]]))
+    return [(station_index, index.stations[station_index]) for _, station_index in scored[:limit]]
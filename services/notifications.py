@@ -0,0 +1,238 @@
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, update, exists, func, bindparam, Update, ColumnElement
+from sqlalchemy.orm import aliased
+from telegram.constants import ParseMode
+from telegram.error import RetryAfter, TelegramError
+from telegram.ext import ContextTypes, Application, ExtBot
+
+from database.connection import async_session
+from database.entities import NotificationOutbox, GroupLeader
+from database.models import ContactModel
+from services.rate_limiter import NOTIFICATION_PRIORITY
+
+NOTIFICATIONS_JOB_NAME = 'notifications'
+DISPATCH_INTERVAL = int(os.getenv('NOTIFICATIONS_INTERVAL', '5'))
+DISPATCH_BATCH_SIZE = 200
+MAX_CONCURRENT_CHATS = 10
+MAX_ATTEMPTS = 8
+MAX_BACKOFF = 3600
+NOTIFICATION_LEASE = 300
+NOTIFICATIONS_LOCK_KEY = 7302
+YOUTH_ADMIN_ID = os.getenv('YOUTH_ADMIN_ID')
+
+_dispatch_requested = asyncio.Event()
+_dispatch_lock = asyncio.Lock()
+
+
+def recipient_id(chat_id: int | str | None) -> int | None:
+    if chat_id is None or chat_id == '':
+        logging.warning('Получатель уведомления не настроен, уведомление пропущено')
+        return None
+    return int(chat_id)
+
+
+def message_notification(chat_id: int | str | None, text: str, parse_mode: str | None = None) -> dict:
+    return {'chat_id': recipient_id(chat_id), 'text': text, 'parse_mode': parse_mode}
+
+
+def contact_notification(chat_id: int | str | None, contact: ContactModel) -> dict:
+    return {
+        'chat_id': recipient_id(chat_id),
+        'phone_number': contact.phone_number,
+        'contact_first_name': contact.first_name,
+        'contact_last_name': contact.last_name
+    }
+
+
+def join_notifications(requester_name: str, contact: ContactModel, group_info_text: str, group_leader: GroupLeader,
+                       is_youth: bool) -> list[dict]:
+    return [
+        notification
+        for notification in recipient_notifications(requester_name, contact, group_info_text, group_leader, is_youth)
+        if notification['chat_id'] is not None
+    ]
+
+
+def recipient_notifications(requester_name: str, contact: ContactModel, group_info_text: str,
+                            group_leader: GroupLeader, is_youth: bool) -> list[dict]:
+    if is_youth:
+        logging.debug('Запрос на молодежную ДГ, пересылаем на Яну')
+        return [
+            message_notification(
+                YOUTH_ADMIN_ID,
+                f'{requester_name} хочет присоединиться к домашней группе \n\n'
+                f'Вот информация о группе и контакт человека: \n\n'
+                f'{group_info_text}',
+                ParseMode.HTML
+            ),
+            contact_notification(YOUTH_ADMIN_ID, contact)
+        ]
+    logging.debug('Запрос на общую ДГ, пересылаем лидеру')
+    group_leader_chat_id = group_leader.telegram_id or os.getenv('ADMIN_ID')
+    if group_leader.region_leader is not None and group_leader.region_leader.telegram_id:
+        regional_leader_chat_id = group_leader.region_leader.telegram_id
+    else:
+        regional_leader_chat_id = os.getenv('ADMIN_ID')
+    return [
+        message_notification(
+            group_leader_chat_id,
+            f'{requester_name} хочет присоединиться к Вашей домашней группе. Вот его/ее контакт:'
+        ),
+        contact_notification(group_leader_chat_id, contact),
+        message_notification(
+            regional_leader_chat_id,
+            f'{requester_name} хочет присоединиться к домашней группе Вашего региона\n\n'
+            f'Вот информация о группе и контакт человека: \n\n'
+            f'{group_info_text}',
+            ParseMode.HTML
+        ),
+        contact_notification(regional_leader_chat_id, contact)
+    ]
+
+
+async def send_notification(bot: ExtBot, notification: NotificationOutbox) -> None:
+    if notification.phone_number is not None:
+        await bot.send_contact(
+            chat_id=notification.chat_id,
+            phone_number=notification.phone_number,
+            first_name=notification.contact_first_name or notification.phone_number,
+            last_name=notification.contact_last_name,
+            rate_limit_args=NOTIFICATION_PRIORITY
+        )
+    else:
+        await bot.send_message(
+            chat_id=notification.chat_id,
+            text=notification.text,
+            parse_mode=notification.parse_mode,
+            rate_limit_args=NOTIFICATION_PRIORITY
+        )
+
+
+async def send_chat_notifications(bot: ExtBot, notifications: list[NotificationOutbox],
+                                  semaphore: asyncio.Semaphore) -> None:
+    async with semaphore:
+        for notification in notifications:
+            try:
+                await send_notification(bot, notification)
+            except Exception as error:
+                notification.attempts += 1
+                if isinstance(error, RetryAfter):
+                    delay = error.retry_after
+                else:
+                    delay = min(2 ** notification.attempts, MAX_BACKOFF)
+                notification.next_attempt_at = datetime.now() + timedelta(seconds=delay)
+                logging.warning('Не удалось отправить уведомление %s в чат %s, попытка %s: %s',
+                                notification.id, notification.chat_id, notification.attempts, error,
+                                exc_info=not isinstance(error, TelegramError))
+                return
+            notification.sent_at = datetime.now()
+
+
+def pending_notifications(outbox: type[NotificationOutbox]) -> ColumnElement[bool]:
+    return (outbox.sent_at.is_(None)) & (outbox.attempts < MAX_ATTEMPTS)
+
+
+def notification_result_statement() -> Update:
+    table = NotificationOutbox.__table__
+    return update(table) \
+        .where(table.c.id == bindparam('b_id')) \
+        .values(
+            attempts=bindparam('b_attempts'),
+            next_attempt_at=bindparam('b_next_attempt_at'),
+            sent_at=bindparam('b_sent_at')
+        )
+
+
+async def claim_notifications() -> list[NotificationOutbox]:
+    now = datetime.now()
+    earlier = aliased(NotificationOutbox)
+    async with async_session() as session:
+        async with session.begin():
+            await session.execute(select(func.pg_advisory_xact_lock(NOTIFICATIONS_LOCK_KEY)))
+            notifications = (await session.execute(
+                select(NotificationOutbox)
+                .where(pending_notifications(NotificationOutbox))
+                .where(NotificationOutbox.next_attempt_at <= now)
+                .where(~exists().where(
+                    earlier.chat_id == NotificationOutbox.chat_id,
+                    earlier.id < NotificationOutbox.id,
+                    pending_notifications(earlier),
+                    earlier.next_attempt_at > now
+                ))
+                .order_by(NotificationOutbox.id)
+                .limit(DISPATCH_BATCH_SIZE)
+            )).scalars().all()
+            if notifications:
+                await session.execute(
+                    update(NotificationOutbox)
+                    .where(NotificationOutbox.id.in_([notification.id for notification in notifications]))
+                    .values(next_attempt_at=now + timedelta(seconds=NOTIFICATION_LEASE))
+                    .execution_options(synchronize_session=False)
+                )
+    return list(notifications)
+
+
+async def store_notification_results(notifications: list[NotificationOutbox]) -> None:
+    async with async_session() as session:
+        async with session.begin():
+            await session.execute(notification_result_statement(), [
+                {
+                    'b_id': notification.id,
+                    'b_attempts': notification.attempts,
+                    'b_next_attempt_at': notification.next_attempt_at,
+                    'b_sent_at': notification.sent_at
+                }
+                for notification in notifications
+            ])
+
+
+async def dispatch_notifications(bot: ExtBot) -> int:
+    notifications = await claim_notifications()
+    if not notifications:
+        return 0
+    by_chat: dict[int, list[NotificationOutbox]] = {}
+    for notification in notifications:
+        by_chat.setdefault(notification.chat_id, []).append(notification)
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_CHATS)
+    try:
+        await asyncio.gather(*(
+            send_chat_notifications(bot, chat_notifications, semaphore)
+            for chat_notifications in by_chat.values()
+        ))
+    finally:
+        await store_notification_results(notifications)
+    sent = sum(1 for notification in notifications if notification.sent_at is not None)
+    logging.info('Отправлено уведомлений: %s, ожидают отправки: %s', sent, len(notifications) - sent)
+    return len(notifications)
+
+
+async def dispatch_until_idle(bot: ExtBot) -> None:
+    _dispatch_requested.set()
+    if _dispatch_lock.locked():
+        return
+    async with _dispatch_lock:
+        while _dispatch_requested.is_set():
+            _dispatch_requested.clear()
+            if await dispatch_notifications(bot) >= DISPATCH_BATCH_SIZE:
+                _dispatch_requested.set()
+
+
+async def notifications_job(context: ContextTypes.DEFAULT_TYPE) -> None:
+    await dispatch_until_idle(context.bot)
+
+
+def wake_notifications(context: ContextTypes.DEFAULT_TYPE) -> None:
+    if _dispatch_lock.locked():
+        _dispatch_requested.set()
+    else:
+        context.application.create_task(dispatch_until_idle(context.bot))
+
+
+def schedule_notifications(application: Application) -> None:
+    application.job_queue.run_repeating(
+        notifications_job, interval=DISPATCH_INTERVAL, first=DISPATCH_INTERVAL, name=NOTIFICATIONS_JOB_NAME
+    )
@@ -0,0 +1,37 @@
+import logging
+import os
+from datetime import datetime
+
+from sqlalchemy import Executable
+
+from database.connection import engine
+from database.entities import GroupLeader
+from database.models import UserModel
+from services.catalog import open_groups_statement
+from services.data_service import user_upsert_statement, leader_backfill_statement, join_target_statement
+from services.import_service import opened_groups_statement
+
+LOG_QUERY_PLANS = os.getenv('LOG_QUERY_PLANS', 'true').lower() == 'true'
+
+
+def hot_queries() -> list[tuple[str, Executable]]:
+    user_model = UserModel('explain', 'explain', 'explain', 0)
+    return [
+        ('catalog_open_groups', open_groups_statement()),
+        ('join_target', join_target_statement(0)),
+        ('user_upsert', user_upsert_statement(user_model, datetime.now())),
+        ('leader_backfill', leader_backfill_statement(GroupLeader, user_model.username, user_model.telegram_id)),
+        ('reconciliation_open_groups', opened_groups_statement()),
+    ]
+
+
+async def log_query_plans() -> None:
+    if not LOG_QUERY_PLANS:
+        return
+    async with engine.connect() as connection:
+        for name, statement in hot_queries():
+            compiled = statement.compile(dialect=engine.dialect)
+            parameters = tuple(compiled.params[key] for key in compiled.positiontup or ())
+            result = await connection.exec_driver_sql(f'EXPLAIN {compiled}', parameters)
+            plan = '\n'.join(row[0] for row in result)
+            logging.info('План запроса %s:\n%s', name, plan)
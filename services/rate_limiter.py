@@ -0,0 +1,178 @@
+import asyncio
+import contextlib
+import logging
+import os
+import time
+from typing import Any, Callable, Coroutine
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+from services.metrics import observe_telegram_request
+
+BOT_WORKERS = int(os.getenv('BOT_WORKERS', '1'))
+GLOBAL_RATE = float(os.getenv('SEND_GLOBAL_RATE', '30')) / BOT_WORKERS
+PRIVATE_CHAT_RATE = float(os.getenv('SEND_CHAT_RATE', '1'))
+PRIVATE_CHAT_BURST = 3
+GROUP_CHAT_RATE = 20 / 60
+NOTIFICATION_RESERVE_SHARE = 1 / 3
+MAX_RETRIES = int(os.getenv('SEND_MAX_RETRIES', '3'))
+MAX_IDLE_CHATS = 512
+USER_PRIORITY = 0
+NOTIFICATION_PRIORITY = 1
+COALESCED_ENDPOINTS = {'editMessageText', 'editMessageReplyMarkup'}
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def refill(self) -> None:
+        now = time.monotonic()
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def delay(self, reserve: float = 0) -> float:
+        self.refill()
+        missing = 1 + reserve - self.tokens
+        return max(missing / self.rate, self.updated - time.monotonic()) if missing > 0 else 0
+
+    def take(self) -> None:
+        self.tokens -= 1
+
+    def pause(self, seconds: float) -> None:
+        self.refill()
+        self.tokens = 0
+        self.updated = max(self.updated, time.monotonic() + seconds)
+
+    def is_full(self) -> bool:
+        self.refill()
+        return self.tokens >= self.capacity
+
+
+class ChatQueue:
+    def __init__(self, chat_id: int | str, private_chat_rate: float = PRIVATE_CHAT_RATE,
+                 group_chat_rate: float = GROUP_CHAT_RATE):
+        if isinstance(chat_id, int) and chat_id > 0:
+            self.bucket = TokenBucket(private_chat_rate, PRIVATE_CHAT_BURST)
+        else:
+            self.bucket = TokenBucket(group_chat_rate, 1)
+        self.lock = asyncio.Lock()
+        self.users = 0
+
+
+class CoalescedEdit:
+    def __init__(self):
+        self.generation = 0
+        self.waiters: list[asyncio.Future] = []
+
+
+def chat_key(data: dict[str, Any]) -> int | str | None:
+    chat_id = data.get('chat_id')
+    if chat_id is None:
+        return None
+    with contextlib.suppress(ValueError, TypeError):
+        return int(chat_id)
+    return chat_id
+
+
+class SendScheduler(BaseRateLimiter[int]):
+    def __init__(self, max_retries: int = MAX_RETRIES, global_rate: float = GLOBAL_RATE,
+                 private_chat_rate: float = PRIVATE_CHAT_RATE, group_chat_rate: float = GROUP_CHAT_RATE):
+        self.max_retries = max_retries
+        self.private_chat_rate = private_chat_rate
+        self.group_chat_rate = group_chat_rate
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.notification_reserve = global_rate * NOTIFICATION_RESERVE_SHARE
+        self.chats: dict[int | str, ChatQueue] = {}
+        self.edits: dict[tuple, CoalescedEdit] = {}
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    def chat_queue(self, chat_id: int | str) -> ChatQueue:
+        if chat_id not in self.chats and len(self.chats) >= MAX_IDLE_CHATS:
+            for key, queue in list(self.chats.items()):
+                if not queue.users and queue.bucket.is_full():
+                    del self.chats[key]
+        if chat_id not in self.chats:
+            self.chats[chat_id] = ChatQueue(chat_id, self.private_chat_rate, self.group_chat_rate)
+        return self.chats[chat_id]
+
+    async def acquire(self, queue: ChatQueue, priority: int) -> None:
+        reserve = self.notification_reserve if priority > USER_PRIORITY else 0
+        while True:
+            delay = max(queue.bucket.delay(), self.global_bucket.delay(reserve))
+            if not delay:
+                queue.bucket.take()
+                self.global_bucket.take()
+                return
+            await asyncio.sleep(delay)
+
+    async def send(self, queue: ChatQueue, chat_id: int | str, priority: int, endpoint: str,
+                   callback: Callable[..., Coroutine[Any, Any, Any]], args: Any, kwargs: dict[str, Any]) -> Any:
+        max_retries = 0 if priority > USER_PRIORITY else self.max_retries
+        for attempt in range(max_retries + 1):
+            await self.acquire(queue, priority)
+            try:
+                return await observe_telegram_request(endpoint, callback, args, kwargs)
+            except RetryAfter as error:
+                queue.bucket.pause(error.retry_after)
+                if attempt == max_retries:
+                    raise
+                logging.warning('Превышен лимит отправки в чат %s, повтор через %s с', chat_id, error.retry_after)
+
+    async def process_request(self, callback: Callable[..., Coroutine[Any, Any, Any]], args: Any,
+                              kwargs: dict[str, Any], endpoint: str, data: dict[str, Any],
+                              rate_limit_args: int | None) -> Any:
+        chat_id = chat_key(data)
+        if chat_id is None:
+            return await observe_telegram_request(endpoint, callback, args, kwargs)
+        priority = rate_limit_args or USER_PRIORITY
+
+        edit = None
+        if endpoint in COALESCED_ENDPOINTS and data.get('message_id') is not None:
+            edit_key = (chat_id, data['message_id'])
+            edit = self.edits.setdefault(edit_key, CoalescedEdit())
+            edit.generation += 1
+            generation = edit.generation
+
+        queue = self.chat_queue(chat_id)
+        queue.users += 1
+        try:
+            async with queue.lock:
+                if edit is not None and edit.generation != generation:
+                    waiter = asyncio.get_running_loop().create_future()
+                    edit.waiters.append(waiter)
+                else:
+                    waiter = None
+                    result = error = None
+                    try:
+                        result = await self.send(queue, chat_id, priority, endpoint, callback, args, kwargs)
+                    except Exception as exception:
+                        error = exception
+                        raise
+                    finally:
+                        if edit is not None:
+                            if edit.generation == generation:
+                                del self.edits[edit_key]
+                            for superseded in edit.waiters:
+                                if error is not None:
+                                    superseded.set_exception(error)
+                                elif result is not None:
+                                    superseded.set_result(result)
+                                else:
+                                    superseded.cancel()
+                            edit.waiters.clear()
+        finally:
+            queue.users -= 1
+        if waiter is not None:
+            return await waiter
+        return result
@@ -0,0 +1,58 @@
+from telegram import InlineKeyboardMarkup
+
+from database.models import CatalogGroupModel, GroupCardModel
+from services.keyboard import search_results_keyboard
+
+PAGE_SIZE = 5
+MESSAGE_LIMIT = 4096
+CARDS_SEPARATOR = '\n\n'
+YOUTH_AGES = ('Молодежные (до 25)', 'Молодежные (после 25)')
+
+ResultPage = tuple[str, InlineKeyboardMarkup]
+
+
+def build_card(group: CatalogGroupModel) -> GroupCardModel:
+    time_str = group.time.strftime('%H:%M')
+    text = f'Метро: <b>{group.metro}</b>\n' \
+           f'День: <b>{group.day}</b>\nВремя: <b>{time_str}</b>\n' \
+           f'Возраст: <b>{group.age}</b>\n' \
+           f'Тип: <b>{group.type}</b>\n' \
+           f'Лидер: <b>{group.leader_name}</b>'
+    return GroupCardModel(group_id=group.id, text=text, is_youth=group.age in YOUTH_AGES)
+
+
+def numbered_card(number: int, card: GroupCardModel) -> str:
+    return f'<b>Группа {number}</b>\n{card.text}'
+
+
+def paginate(texts: list[str]) -> list[range]:
+    pages = []
+    start = 0
+    length = 0
+    for index, text in enumerate(texts):
+        text_length = len(text) + len(CARDS_SEPARATOR)
+        if index > start and (index - start >= PAGE_SIZE or length + text_length > MESSAGE_LIMIT):
+            pages.append(range(start, index))
+            start = index
+            length = 0
+        length += text_length
+    if start < len(texts):
+        pages.append(range(start, len(texts)))
+    return pages
+
+
+def render_pages(cards: list[GroupCardModel]) -> tuple[ResultPage, ...]:
+    texts = [numbered_card(number, card) for number, card in enumerate(cards, start=1)]
+    pages = paginate(texts)
+    rendered = []
+    for page, page_range in enumerate(pages):
+        text = CARDS_SEPARATOR.join(texts[index] for index in page_range)
+        if len(pages) > 1:
+            text += f'{CARDS_SEPARATOR}Страница {page + 1} из {len(pages)}'
+        keyboard = search_results_keyboard(
+            [(index + 1, cards[index].group_id) for index in page_range],
+            page,
+            len(pages)
+        )
+        rendered.append((text, keyboard))
+    return tuple(rendered)
@@ -0,0 +1,95 @@
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, update, or_
+from telegram.ext import ContextTypes, Application
+
+from database.connection import async_session
+from database.entities import SheetOutbox
+from services.adapters import get_join_sink
+
+YOUTH_WORKSHEET = 'Молодежные заявки'
+GENERAL_WORKSHEET = 'Общие заявки'
+SHEET_OUTBOX_JOB_NAME = 'sheet_outbox'
+FLUSH_INTERVAL = int(os.getenv('SHEETS_FLUSH_INTERVAL', '10'))
+FLUSH_BATCH_SIZE = 200
+MAX_ATTEMPTS = 10
+CLAIM_LEASE = 300
+
+
+def worksheet_title(is_youth: bool) -> str:
+    return YOUTH_WORKSHEET if is_youth else GENERAL_WORKSHEET
+
+
+async def claim_sheet_entries() -> list[SheetOutbox]:
+    now = datetime.now()
+    async with async_session() as session:
+        async with session.begin():
+            entries = (await session.execute(
+                select(SheetOutbox)
+                .where(SheetOutbox.sent_at.is_(None))
+                .where(SheetOutbox.attempts < MAX_ATTEMPTS)
+                .where(or_(SheetOutbox.claimed_until.is_(None), SheetOutbox.claimed_until < now))
+                .order_by(SheetOutbox.id)
+                .limit(FLUSH_BATCH_SIZE)
+                .with_for_update(skip_locked=True)
+            )).scalars().all()
+            for entry in entries:
+                entry.claimed_until = now + timedelta(seconds=CLAIM_LEASE)
+    return list(entries)
+
+
+async def store_sheet_results(sent_ids: list[int], failed_ids: list[int]) -> None:
+    async with async_session() as session:
+        async with session.begin():
+            if sent_ids:
+                await session.execute(
+                    update(SheetOutbox)
+                    .where(SheetOutbox.id.in_(sent_ids))
+                    .values(sent_at=datetime.now(), claimed_until=None)
+                )
+            if failed_ids:
+                await session.execute(
+                    update(SheetOutbox)
+                    .where(SheetOutbox.id.in_(failed_ids))
+                    .values(attempts=SheetOutbox.attempts + 1, claimed_until=None)
+                )
+
+
+async def flush_sheet_outbox() -> int:
+    entries = await claim_sheet_entries()
+    by_worksheet: dict[str, list[SheetOutbox]] = {}
+    for entry in entries:
+        by_worksheet.setdefault(entry.worksheet, []).append(entry)
+    sent_ids: list[int] = []
+    failed_ids: list[int] = []
+    for title, worksheet_entries in by_worksheet.items():
+        rows = [entry.values for entry in worksheet_entries]
+        try:
+            await asyncio.to_thread(get_join_sink().append_rows, title, rows)
+        except Exception as error:
+            logging.warning('Не удалось записать заявки в лист %s: %s', title, error)
+            get_join_sink().reset()
+            failed_ids += [entry.id for entry in worksheet_entries]
+            for entry in worksheet_entries:
+                if entry.attempts + 1 >= MAX_ATTEMPTS:
+                    logging.error('Заявка %s не записана в таблицу после %s попыток', entry.id, entry.attempts + 1)
+            continue
+        sent_ids += [entry.id for entry in worksheet_entries]
+    if entries:
+        await store_sheet_results(sent_ids, failed_ids)
+    if sent_ids:
+        logging.info('Добавлено новых значений в таблицу заявок в ДГ: %s', len(sent_ids))
+    return len(sent_ids)
+
+
+async def sheet_outbox_job(context: ContextTypes.DEFAULT_TYPE) -> None:
+    await flush_sheet_outbox()
+
+
+def schedule_sheet_outbox(application: Application) -> None:
+    application.job_queue.run_repeating(
+        sheet_outbox_job, interval=FLUSH_INTERVAL, first=FLUSH_INTERVAL, name=SHEET_OUTBOX_JOB_NAME
+    )